@@ -13,27 +13,36 @@ Notes
 from __future__ import annotations
 
 import os
+from functools import lru_cache
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 
+_env_loaded = False
+
+
 def _load_env() -> None:
     """
     Load environment variables from the project root `.env`.
 
     Do not rely on current working directory (ADK web server may run elsewhere).
+    Runs at most once per process, even if this module is re-imported.
     """
+    global _env_loaded
+    if _env_loaded:
+        return
+
     project_root = Path(__file__).resolve().parents[1]
     env_path = project_root / ".env"
     if env_path.exists():
         load_dotenv(env_path, override=True)
-        return
-
-    # Fallback to CWD for compatibility
-    cwd_env = Path.cwd() / ".env"
-    if cwd_env.exists():
-        load_dotenv(cwd_env, override=True)
+    else:
+        # Fallback to CWD for compatibility
+        cwd_env = Path.cwd() / ".env"
+        if cwd_env.exists():
+            load_dotenv(cwd_env, override=True)
+    _env_loaded = True
 
 
 _load_env()
@@ -72,14 +81,29 @@ def _bridge_llm_env_vars() -> None:
 
 _bridge_llm_env_vars()
 
-# Enable nested asyncio when used in notebooks / embedded runtimes
-try:
-    import nest_asyncio
+_nest_asyncio_applied = False
+
+
+def _apply_nest_asyncio() -> None:
+    """
+    Enable nested asyncio when used in notebooks / embedded runtimes.
 
-    nest_asyncio.apply()
-except Exception:
-    # Optional dependency / optional behavior
-    pass
+    Patch at most once: re-applying re-wraps the loop methods.
+    """
+    global _nest_asyncio_applied
+    if _nest_asyncio_applied:
+        return
+    try:
+        import nest_asyncio
+
+        nest_asyncio.apply()
+        _nest_asyncio_applied = True
+    except Exception:
+        # Optional dependency / optional behavior
+        pass
+
+
+_apply_nest_asyncio()
 
 
 try:
@@ -153,44 +177,63 @@ def _litellm_model_id() -> str:
 
 
 # === Root LLM Agent ===
-root_agent = LlmAgent(
-    model=LiteLlm(model=_litellm_model_id()),
-    name="MrDice_Agent",
-    description="Unified materials search agent that calls MrDice MCP tool `fetch_structures_from_db`.",
-    instruction=(
-        "You can call one MCP tool exposed by the MrDice server:\n\n"
-        "=== TOOL: fetch_structures_from_db ===\n"
-        "Use this tool to search materials across multiple databases (OPTIMADE, MOFdb SQL, OpenLAM, Bohrium public).\n"
-        "Arguments:\n"
-        "• query: natural language query\n"
-        "• n_results: number of results to return\n"
-        "• output_format: 'cif' or 'json'\n\n"
-        "Returns:\n"
-        "• results: list of normalized items, each may contain `structure_file`\n"
-        "• n_found / returned / fallback_level\n\n"
-        "=== EXAMPLES ===\n"
-        "1) 找一些 Fe2O3 材料，返回 3 个结构文件：\n"
-        "   → Tool: fetch_structures_from_db\n"
-        "     query: '找一些 Fe2O3 材料'\n"
-        "     n_results: 3\n"
-        "     output_format: 'cif'\n\n"
-        "2) 搜索包含 Li 和 O 的电池材料，给我全部信息：\n"
-        "   → Tool: fetch_structures_from_db\n"
-        "     query: '搜索包含 Li 和 O 的电池材料'\n"
-        "     n_results: 5\n"
-        "     output_format: 'json'\n\n"
-        "=== ANSWER FORMAT ===\n"
-        "1. Summarize the query intent\n"
-        "2. Report n_found/returned/fallback_level\n"
-        "3. List structure_file paths if available\n"
-    ),
-    tools=[mcp_tools],
-)
+# Single literal: built at compile time, shared by every agent instance.
+ROOT_AGENT_INSTRUCTION = """\
+You can call one MCP tool exposed by the MrDice server:
+
+=== TOOL: fetch_structures_from_db ===
+Use this tool to search materials across multiple databases (OPTIMADE, MOFdb SQL, OpenLAM, Bohrium public).
+Arguments:
+• query: natural language query
+• n_results: number of results to return
+• output_format: 'cif' or 'json'
+
+Returns:
+• results: list of normalized items, each may contain `structure_file`
+• n_found / returned / fallback_level
+
+=== EXAMPLES ===
+1) 找一些 Fe2O3 材料，返回 3 个结构文件：
+   → Tool: fetch_structures_from_db
+     query: '找一些 Fe2O3 材料'
+     n_results: 3
+     output_format: 'cif'
+
+2) 搜索包含 Li 和 O 的电池材料，给我全部信息：
+   → Tool: fetch_structures_from_db
+     query: '搜索包含 Li 和 O 的电池材料'
+     n_results: 5
+     output_format: 'json'
+
+=== ANSWER FORMAT ===
+1. Summarize the query intent
+2. Report n_found/returned/fallback_level
+3. List structure_file paths if available
+"""
+
+
+@lru_cache(maxsize=1)
+def get_root_agent() -> LlmAgent:
+    """
+    Build the root agent once per process; repeated calls return the same instance.
+    """
+    return LlmAgent(
+        model=LiteLlm(model=_litellm_model_id()),
+        name="MrDice_Agent",
+        description="Unified materials search agent that calls MrDice MCP tool `fetch_structures_from_db`.",
+        instruction=ROOT_AGENT_INSTRUCTION,
+        tools=[mcp_tools],
+    )
+
+
+root_agent = get_root_agent()
 
 
 __all__ = [
     "BOHRIUM_EXECUTOR",
     "HTTPS_STORAGE",
+    "ROOT_AGENT_INSTRUCTION",
+    "get_root_agent",
     "mcp_tools",
     "root_agent",
 ]
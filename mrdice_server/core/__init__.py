@@ -8,7 +8,12 @@ from .config import (
     get_bohrium_output_dir,
     get_data_dir,
     get_llm_config,
+    get_query_cache_config,
+    get_thread_pool_size,
 )
+from .cache import TTLCache
+from .pool import get_process_pool, shutdown_process_pool
+from .utils import short_hash
 from .error import ErrorType, MrDiceError, classify_error, handle_error, log_error
 from .logger import get_logger, setup_logger
 from .llm_client import LlmError, chat_json
@@ -39,6 +44,15 @@ __all__ = [
     "get_llm_config",
     "get_data_dir",
     "get_bohrium_output_dir",
+    "get_query_cache_config",
+    "get_thread_pool_size",
+    # Cache
+    "TTLCache",
+    # Process pool
+    "get_process_pool",
+    "shutdown_process_pool",
+    # Utilities
+    "short_hash",
     # LLM
     "LlmError",
     "chat_json",
@@ -50,6 +50,25 @@ def get_optimade_timeouts() -> tuple[float, float]:
     return max(5.0, http_timeout), max(30.0, total_timeout)
 
 
+def get_query_cache_config() -> tuple[int, float]:
+    """
+    Get size and TTL of the in-process remote query caches.
+    - MR_DICE_QUERY_CACHE_SIZE: max cached queries per database (default 256, 0 disables)
+    - MR_DICE_QUERY_CACHE_TTL: seconds a cached result stays valid (default 300)
+    """
+    maxsize = int(os.getenv("MR_DICE_QUERY_CACHE_SIZE", "256"))
+    ttl = float(os.getenv("MR_DICE_QUERY_CACHE_TTL", "300"))
+    return max(0, maxsize), max(0.0, ttl)
+
+
+def get_thread_pool_size() -> int:
+    """
+    Get the number of worker threads for blocking work (retriever fetches, file saves).
+    - THREAD_POOL_SIZE: max worker threads (default 64; anyio's default limiter is 40)
+    """
+    return max(1, int(os.getenv("THREAD_POOL_SIZE", "64")))
+
+
 def get_bohrium_output_dir() -> Path:
     """
     Get the output directory for Bohrium public database results.
@@ -1,10 +1,20 @@
 import json
+import threading
 from typing import Optional
 
 import requests
 
 from .config import get_llm_config
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json fallback
+    orjson = None
+
+# One pooled session per thread: keeps the TCP/TLS connection to the LLM
+# endpoint alive across calls (requests.Session is not guaranteed thread-safe).
+_local = threading.local()
+
 
 class LlmError(RuntimeError):
     pass
@@ -20,6 +30,13 @@ def _resolve_api_base(provider: str, api_base: Optional[str]) -> str:
     raise LlmError(f"Unknown provider: {provider}")
 
 
+def _get_session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
 def chat_json(system: str, user: str, timeout: int = 30) -> str:
     """
     Call an OpenAI-compatible chat completion endpoint.
@@ -44,9 +61,10 @@ def chat_json(system: str, user: str, timeout: int = 30) -> str:
         "temperature": 0.2,
     }
     try:
-        resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=timeout)
+        body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode("utf-8")
+        resp = _get_session().post(url, headers=headers, data=body, timeout=timeout)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content) if orjson is not None else resp.json()
         return data["choices"][0]["message"]["content"]
     except Exception as exc:
         raise LlmError(f"LLM request failed: {exc}") from exc
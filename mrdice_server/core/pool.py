@@ -0,0 +1,41 @@
+"""
+Process-wide process pool for CPU-bound work (CIF rendering).
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Lazily start the shared process pool, shut down at interpreter exit.
+
+    Uses the spawn start method: the server is multi-threaded, so forking it
+    is unsafe. Every database module shares this one pool instead of each
+    spawning its own set of workers.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                atexit.register(shutdown_process_pool)
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the shared pool's workers; the next `get_process_pool` starts a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,12 +1,15 @@
 """
 Preprocessing module: intent recognition, parameter construction, and parameter correction.
 """
+import copy
 import json
 import logging
 import os
 import re
 from typing import Any, Dict, List, Optional, Tuple
 
+from .cache import TTLCache
+from .config import get_query_cache_config
 from .llm_client import LlmError, chat_json
 from .prompt import (
     SYSTEM_PROMPT_CORRECT,
@@ -17,13 +20,23 @@ from .prompt import (
     USER_PROMPT_PARAMS_TEMPLATE,
 )
 
+# Preprocessing results keyed by the whitespace-normalized query; identical
+# queries skip both LLM round-trips while the entry is fresh.
+_preprocess_cache = TTLCache(*get_query_cache_config())
+
+# Heuristic / response-parsing patterns, compiled once
+_RE_JSON = re.compile(r"\{[\s\S]*\}")
+_RE_FORMULA = re.compile(r"\b([A-Z][a-z]?\d*){2,}\b")
+_RE_ELEMENT = re.compile(r"[A-Z][a-z]?")
+_RE_WS = re.compile(r"\s+")
+
 
 def _strip_json(text: str) -> str:
     """Extract the first JSON object in the response."""
     text = text.strip()
     if text.startswith("{") and text.endswith("}"):
         return text
-    match = re.search(r"\{[\s\S]*\}", text)
+    match = _RE_JSON.search(text)
     if match:
         return match.group(0)
     return text
@@ -39,34 +52,20 @@ def _safe_json_loads(text: str) -> Optional[Dict[str, Any]]:
 
 def _extract_formula(query: str) -> Optional[str]:
     """Simple chemical formula heuristic: e.g., Fe2O3, LiFePO4."""
-    match = re.search(r"\b([A-Z][a-z]?\d*){2,}\b", query)
+    match = _RE_FORMULA.search(query)
     return match.group(0) if match else None
 
 
 def _extract_elements(query: str) -> List[str]:
     """Heuristic: collect element symbols from capital letters."""
-    elems = re.findall(r"[A-Z][a-z]?", query)
-    seen = set()
-    result = []
-    for e in elems:
-        if e not in seen:
-            seen.add(e)
-            result.append(e)
-    return result
+    return list(dict.fromkeys(_RE_ELEMENT.findall(query)))
 
 
 def _elements_from_formula(formula: Optional[str]) -> List[str]:
     """Extract elements from formula."""
     if not formula:
         return []
-    elems = re.findall(r"[A-Z][a-z]?", formula)
-    seen = set()
-    result = []
-    for e in elems:
-        if e not in seen:
-            seen.add(e)
-            result.append(e)
-    return result
+    return list(dict.fromkeys(_RE_ELEMENT.findall(formula)))
 
 
 def recognize_intent(query: str) -> Dict[str, Any]:
@@ -161,7 +160,7 @@ def construct_parameters(query: str, material_type: str, domain: str) -> Dict[st
             "energy": {"min": None, "max": None},
             "time_range": {"start": None, "end": None},
         },
-        "keywords": [w for w in re.split(r"\s+", query) if w],
+        "keywords": [w for w in _RE_WS.split(query) if w],
         "strictness": "relaxed",
     }
 
@@ -220,6 +219,12 @@ def preprocess_query(query: str) -> Dict[str, Any]:
             "expanded_query": "",
             "strictness": "relaxed",
         }
+
+    cache_key = " ".join(query.split())
+    cached = _preprocess_cache.get(cache_key)
+    if cached is not None:
+        # Callers may mutate filters/keywords, so never hand out the cached dict
+        return copy.deepcopy(cached)
     
     # Step 1: Intent recognition
     intent = recognize_intent(query)
@@ -229,7 +234,7 @@ def preprocess_query(query: str) -> Dict[str, Any]:
     # Step 2: Parameter construction
     params = construct_parameters(query, material_type, domain)
     
-    return {
+    result = {
         "material_type": material_type,
         "domain": domain,
         "filters": params.get("filters", {}),
@@ -237,4 +242,6 @@ def preprocess_query(query: str) -> Dict[str, Any]:
         "expanded_query": params.get("expanded_query", query),
         "strictness": params.get("strictness", "relaxed"),
     }
+    _preprocess_cache.set(cache_key, copy.deepcopy(result))
+    return result
 
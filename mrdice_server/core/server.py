@@ -1,32 +1,47 @@
 import argparse
-import hashlib
+import asyncio
 import json
 import logging
+import os
 import re
 import shutil
-from datetime import datetime
+import time
 from pathlib import Path
-from typing import Any, Dict, List, TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
 
 from dotenv import load_dotenv
 from dp.agent.server import CalculationMCPServer
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json fallback
+    orjson = None
+
+
+_env_loaded = False
+
+
 def _load_env() -> None:
     """
     Load environment variables from the project root `.env`.
 
     Do not rely on current working directory (tools / ADK web may import this module).
+    Runs at most once per process, even if this module is re-imported.
     """
+    global _env_loaded
+    if _env_loaded:
+        return
+
     project_root = Path(__file__).resolve().parents[2]
     env_path = project_root / ".env"
     if env_path.exists():
         load_dotenv(env_path, override=True)
-        return
-
-    # Fallback to CWD for compatibility
-    cwd_env = Path.cwd() / ".env"
-    if cwd_env.exists():
-        load_dotenv(cwd_env, override=True)
+    else:
+        # Fallback to CWD for compatibility
+        cwd_env = Path.cwd() / ".env"
+        if cwd_env.exists():
+            load_dotenv(cwd_env, override=True)
+    _env_loaded = True
 
 
 _load_env()
@@ -37,6 +52,8 @@ from ..search.ranker import rank_results
 from ..search.router import normalize_n_results
 from ..models.schema import build_response, SearchResult
 from ..search.searcher import ALL_DATABASE_NAMES, search_databases_parallel_with_errors
+from .logger import get_logger, setup_logger
+from .utils import short_hash
 
 
 class MrDiceToolResult(TypedDict):
@@ -60,7 +77,7 @@ class MrDiceToolResult(TypedDict):
     errors: Dict[str, str]
 
 
-def parse_args():
+def parse_args(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description="MrDice Unified MCP Server")
     parser.add_argument("--port", type=int, default=50001, help="Server port (default: 50001)")
     parser.add_argument("--host", default="0.0.0.0", help="Server host (default: 0.0.0.0)")
@@ -76,74 +93,80 @@ def parse_args():
         default=None,
         help="Log file path (default: MR_DICE_BOHRIUM_OUTPUT_DIR/mr_dice.log or ./mr_dice.log)",
     )
-    try:
-        # Use parse_known_args to avoid breaking other CLIs that import this module (e.g. `adk web`).
-        args, _unknown = parser.parse_known_args()
-        return args
-    except SystemExit:
-        class Args:
-            port = 50001
-            host = "0.0.0.0"
-            log_level = "INFO"
-            log_file = None
-        return Args()
-
-
-args = parse_args()
-
-# Setup logger with file output
-from .logger import setup_logger
-import os
+    # parse_known_args: unrelated flags from a wrapping CLI are ignored; invalid values
+    # for our own options exit with argparse's usage error.
+    args, _unknown = parser.parse_known_args(argv)
+    return args
+
+
+# Configured with file output by `main()`; importers keep their own logging setup
+logger = get_logger("mrdice")
+
+
+def setup_server_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> None:
+    """
+    Attach console/file handlers to the `mrdice` logger and route dp/mcp logs to them.
+    """
+    # Default log file path: use MR_DICE_BOHRIUM_OUTPUT_DIR if set, otherwise use current directory
+    if log_file is None:
+        bohrium_output_dir = os.getenv("MR_DICE_BOHRIUM_OUTPUT_DIR")
+        if bohrium_output_dir:
+            base_dir = Path(bohrium_output_dir)
+        else:
+            base_dir = Path.cwd()
 
-# Default log file path: use MR_DICE_BOHRIUM_OUTPUT_DIR if set, otherwise use current directory
-if args.log_file is None:
-    bohrium_output_dir = os.getenv("MR_DICE_BOHRIUM_OUTPUT_DIR")
-    if bohrium_output_dir:
-        base_dir = Path(bohrium_output_dir)
+        # Use date-based filename by default
+        date_tag = time.strftime("%Y%m%d")
+        log_path = base_dir / f"mr_dice_{date_tag}.log"
     else:
-        base_dir = Path.cwd()
-
-    # Use date-based filename by default
-    date_tag = datetime.now().strftime("%Y%m%d")
-    log_file = base_dir / f"mr_dice_{date_tag}.log"
-else:
-    log_file = Path(args.log_file)
-
-logger = setup_logger(
-    name="mrdice",
-    level=args.log_level,
-    log_file=log_file,
-)
-logger.info(f"Log file: {log_file.resolve()}")
+        log_path = Path(log_file)
 
-# Also bind dp/mcp internal logs to the same handlers so you can see
-# tool-call execution logs in the server console (not only uvicorn access logs).
-try:
-    _log_level = getattr(logging, args.log_level.upper(), logging.INFO)
-    for _name in [
-        "dp",
-        "dp.agent",
-        "dp.agent.server",
-        "dpdispatcher",
-        "mcp",
-        "mcp.server",
-    ]:
-        _l = logging.getLogger(_name)
-        _l.setLevel(_log_level)
-        _l.handlers.clear()
-        for _h in logger.handlers:
-            _l.addHandler(_h)
-        _l.propagate = False
-except Exception:
-    # Don't block server startup if logging binding fails
-    pass
+    # Same object as the module-level `logger` (logging.getLogger("mrdice"))
+    setup_logger(
+        name="mrdice",
+        level=log_level,
+        log_file=log_path,
+    )
+    logger.info(f"Log file: {log_path.resolve()}")
+
+    # Also bind dp/mcp internal logs to the same handlers so you can see
+    # tool-call execution logs in the server console (not only uvicorn access logs).
+    try:
+        _log_level = getattr(logging, log_level.upper(), logging.INFO)
+        for _name in [
+            "dp",
+            "dp.agent",
+            "dp.agent.server",
+            "dpdispatcher",
+            "mcp",
+            "mcp.server",
+        ]:
+            _l = logging.getLogger(_name)
+            _l.setLevel(_log_level)
+            _l.handlers.clear()
+            for _h in logger.handlers:
+                _l.addHandler(_h)
+            _l.propagate = False
+    except Exception:
+        # Don't block server startup if logging binding fails
+        pass
 
+
+# Tools register on this instance at import; host/port are applied in `main()`
 mcp = CalculationMCPServer(
     "MrDiceServer",
-    port=args.port,
-    host=args.host
+    port=50001,
+    host="0.0.0.0"
 )
 
+
+def _bind_server_address(host: str, port: int) -> None:
+    """Point the MCP server at the host/port given on the command line."""
+    # CalculationMCPServer wraps a FastMCP instance, which reads host/port from its settings at run()
+    settings = getattr(getattr(mcp, "mcp", mcp), "settings")
+    settings.host = host
+    settings.port = port
+
 # Keys whose values should be masked when printing env (e.g. API keys, secrets)
 _ENV_MASK_KEYS = frozenset({
     "LLM_API_KEY", "MATERIALS_ACCESS_KEY",
@@ -158,7 +181,10 @@ def print_startup_env() -> None:
     """
     keys = [
         "LLM_PROVIDER", "LLM_MODEL", "LLM_API_BASE", "LLM_API_KEY", "LLM_DEBUG",
-        "MR_DICE_DATA_DIR", "MR_DICE_BOHRIUM_OUTPUT_DIR", "MOFDB_SQL_DB_PATH",
+        "MR_DICE_DATA_DIR", "MR_DICE_BOHRIUM_OUTPUT_DIR", "MOFDB_SQL_DB_PATH", "MOFDB_SQL_AUTO_MIGRATE",
+        "MR_DICE_QUERY_CACHE_SIZE", "MR_DICE_QUERY_CACHE_TTL", "OPTIMADE_CACHE_DIR", "OPTIMADE_CACHE_DISK_TTL",
+        "OPTIMADE_RESPONSE_FIELDS", "OPTIMADE_MAX_PER_HOST", "OPTIMADE_MAX_RETRIES", "OPTIMADE_MAX_IN_FLIGHT",
+        "THREAD_POOL_SIZE", "OPENLAM_FAST_CIF",
         "BOHRIUM_USER_ID", "BOHRIUM_BASE_URL", "BOHRIUM_ACCESS_KEY", "BOHRIUM_PROJECT_ID",
         "MATERIALS_ACCESS_KEY", "MATERIALS_PROJECT_ID", "MATERIALS_SKU_ID",
         "OSS_ENABLED", "OSS_BUCKET_NAME", "OSS_ACCESS_KEY_ID", "OSS_ACCESS_KEY_SECRET", "OSS_ENDPOINT",
@@ -196,14 +222,23 @@ def _build_mrdice_output_dir(query_used: str) -> Path:
     Build a MrDice output directory path similar to OPTIMADE MCP servers.
     """
     base_dir = get_data_dir() / "materials_data_mrdice"
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    short = hashlib.sha1((query_used or "").encode("utf-8")).hexdigest()[:8]
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    short = short_hash(query_used or "")
     tag = _tag_from_text(query_used)
     out_dir = base_dir / f"{tag}_{ts}_{short}"
     out_dir.mkdir(parents=True, exist_ok=True)
     return out_dir
 
 
+def _dump_json_bytes(obj: Any) -> bytes:
+    """
+    Serialize to compact UTF-8 JSON bytes (orjson when available).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
 def _collect_and_copy_result_files(
     *, results: List[SearchResult], output_dir: Path, output_format: str
 ) -> List[Path]:
@@ -275,7 +310,8 @@ async def fetch_structures_from_db(
     
     # === PREPROCESSING ===
     # Step 1: Intent recognition and parameter construction
-    preprocessed = preprocess_query(query)
+    # (blocking LLM calls run on a worker thread so the event loop keeps serving)
+    preprocessed = await asyncio.to_thread(preprocess_query, query)
     material_type = preprocessed["material_type"]
     domain = preprocessed["domain"]
     filters = preprocessed["filters"]
@@ -361,7 +397,7 @@ async def fetch_structures_from_db(
         "results": ranked,
     }
     try:
-        (output_dir / "summary.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+        (output_dir / "summary.json").write_bytes(_dump_json_bytes(manifest))
     except Exception:
         pass
 
@@ -384,7 +420,15 @@ async def fetch_structures_from_db(
     return resp
 
 
-if __name__ == "__main__":
+def main(argv: Optional[List[str]] = None) -> None:
+    """Parse CLI arguments, configure logging and run the MCP server (SSE)."""
+    args = parse_args(argv)
+    setup_server_logging(args.log_level, args.log_file)
+    _bind_server_address(args.host, args.port)
     print_startup_env()
     logger.info("Starting MrDice Unified MCP Server...")
     mcp.run(transport="sse")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Small shared helpers.
+"""
+import hashlib
+
+# Pre-initialized 4-byte blake2b state: copy() skips the constructor's parameter setup
+_SHORT_HASH_PROTO = hashlib.blake2b(digest_size=4)
+
+
+def short_hash(text: str) -> str:
+    """
+    8-hex blake2b digest of `text`.
+
+    Used to tell output folders apart, not for security.
+    """
+    h = _SHORT_HASH_PROTO.copy()
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
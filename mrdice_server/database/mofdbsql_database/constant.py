@@ -72,6 +72,15 @@ RULES = {
             "isotherms: adsorption data",
             "heats: heat of adsorption data",
         ],
+        "materialized_tables": [
+            "mof_adsorbate_avg: mof_id, adsorbate_name, avg_adsorption",
+            "mof_temp_avg: mof_id, temperature, avg_adsorption",
+            "mof_heat_avg: mof_id, avg_heat, n_points, surface_area_m2g",
+        ],
+        "materialized_note": (
+            "Precomputed by migrate.py; prefer these over re-aggregating "
+            "isotherm/heat data with GROUP BY in CTEs"
+        ),
     },
 }
 
@@ -102,6 +111,17 @@ USAGE_EXAMPLES = [
         "query": "Count MOFs by database",
         "sql": "SELECT database, COUNT(*) as count FROM mofs GROUP BY database ORDER BY count DESC",
     },
+    {
+        "description": "Average adsorption per MOF from materialized aggregates",
+        "query": "Top MOFs by average CO2 adsorption",
+        "sql": """
+            SELECT m.name, m.database, a.avg_adsorption
+            FROM mof_adsorbate_avg a JOIN mofs m ON m.id = a.mof_id
+            WHERE a.adsorbate_name = 'CarbonDioxide'
+            ORDER BY a.avg_adsorption DESC
+            LIMIT 10
+        """,
+    },
     {
         "description": "Query with window functions",
         "query": "Top MOFs by surface area per database",
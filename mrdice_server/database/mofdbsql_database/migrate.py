@@ -0,0 +1,123 @@
+"""
+MOFdb SQLite one-time migrations.
+
+The MOFdb database is static and queried read-only at runtime, so derived
+structures (indexes, materialized aggregate tables, statistics) are built
+once here and tracked with `PRAGMA user_version`.
+
+Usage:
+    python migrate.py /path/to/mofdb.sqlite
+"""
+import logging
+import sqlite3
+import sys
+from pathlib import Path
+from typing import List, Tuple, Union
+
+# Covering indexes for the foreign-key join paths used by analytical queries
+SCHEMA_V1_INDEXES: List[str] = [
+    "CREATE INDEX IF NOT EXISTS idx_elements_mof_id ON elements(mof_id, element_symbol, n_atom)",
+    "CREATE INDEX IF NOT EXISTS idx_isotherms_mof_id ON isotherms(mof_id, temperature)",
+    "CREATE INDEX IF NOT EXISTS idx_isotherm_data_iso ON isotherm_data(isotherm_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_ispd_data_ads ON isotherm_species_data(isotherm_data_id, adsorbate_id, adsorption)",
+    "CREATE INDEX IF NOT EXISTS idx_heats_mof_id ON heats(mof_id)",
+    "CREATE INDEX IF NOT EXISTS idx_heat_data_heat ON heat_data(heat_id)",
+]
+
+# Materialized aggregates for hot analytical CTEs (the DB is static, so these
+# never go stale); each table gets an index on its lookup columns.
+SCHEMA_V2_AGGREGATES: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS mof_adsorbate_avg AS
+    SELECT i.mof_id AS mof_id, a.name AS adsorbate_name, AVG(isd.adsorption) AS avg_adsorption
+    FROM isotherms i
+    JOIN isotherm_data idt ON idt.isotherm_id = i.id
+    JOIN isotherm_species_data isd ON isd.isotherm_data_id = idt.id
+    JOIN adsorbates a ON a.id = isd.adsorbate_id
+    GROUP BY i.mof_id, a.name
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_mof_adsorbate_avg ON mof_adsorbate_avg(adsorbate_name, mof_id, avg_adsorption)",
+    """
+    CREATE TABLE IF NOT EXISTS mof_temp_avg AS
+    SELECT i.mof_id AS mof_id, i.temperature AS temperature, AVG(isd.adsorption) AS avg_adsorption
+    FROM isotherms i
+    JOIN isotherm_data idt ON idt.isotherm_id = i.id
+    JOIN isotherm_species_data isd ON isd.isotherm_data_id = idt.id
+    GROUP BY i.mof_id, i.temperature
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_mof_temp_avg ON mof_temp_avg(temperature, mof_id, avg_adsorption)",
+    """
+    CREATE TABLE IF NOT EXISTS mof_heat_avg AS
+    SELECT h.mof_id AS mof_id, AVG(hd.total_adsorption) AS avg_heat, COUNT(*) AS n_points,
+           m.surface_area_m2g AS surface_area_m2g
+    FROM heats h
+    JOIN heat_data hd ON hd.heat_id = h.id
+    JOIN mofs m ON m.id = h.mof_id
+    GROUP BY h.mof_id
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_mof_heat_avg ON mof_heat_avg(mof_id)",
+]
+
+# (version, statements) in ascending order
+MIGRATIONS: List[Tuple[int, List[str]]] = [
+    (1, SCHEMA_V1_INDEXES),
+    (2, SCHEMA_V2_AGGREGATES),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the migration version recorded in the database."""
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate_mofdb(db_path: Union[str, Path]) -> int:
+    """
+    Apply pending migrations to the MOFdb SQLite database.
+
+    Each version is applied in its own transaction together with its
+    `user_version` bump: if any statement fails, that version is rolled back,
+    the recorded version stays at the last complete one (so the next run
+    retries it), and the error is re-raised.
+
+    Returns:
+        Schema version after migration.
+    """
+    # Autocommit mode: transactions are opened explicitly below, so DDL
+    # (CREATE INDEX / CREATE TABLE AS) is part of them and can be rolled back.
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        current = get_schema_version(conn)
+        if current >= SCHEMA_VERSION:
+            return current
+
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN")
+            try:
+                for stmt in statements:
+                    conn.execute(stmt)
+                conn.execute(f"PRAGMA user_version={int(version)}")
+                conn.execute("COMMIT")
+            except sqlite3.Error as exc:
+                conn.execute("ROLLBACK")
+                logging.error(f"MOFdb migration v{version} rolled back, staying at v{current}: {exc}")
+                raise
+            current = version
+
+        # Refresh planner statistics once after all schema changes
+        conn.execute("ANALYZE")
+        logging.info(f"MOFdb migrated to schema version {current}: {db_path}")
+        return current
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python migrate.py /path/to/mofdb.sqlite")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    print(f"schema version: {migrate_mofdb(sys.argv[1])}")
@@ -1,8 +1,11 @@
 import json
 import logging
 import os, re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Literal, TypedDict, Any
+from typing import List, Literal, Sequence, TypedDict, Any
 
 Format = Literal["cif", "json"]
 
@@ -20,6 +23,33 @@ MOFDB_DROP_ATTRS = {
 
 from typing import Optional
 
+# Comments and quoted literals/identifiers, removed before keyword checks so that
+# e.g. `-- DROP` or `SELECT 'INSERT'` are not mistaken for statements.
+_SQL_NON_CODE_RE = re.compile(
+    r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]",
+    re.DOTALL,
+)
+
+_DANGEROUS_KEYWORDS = (
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
+    'TRUNCATE', 'REPLACE', 'MERGE', 'EXEC', 'EXECUTE', 'CALL',
+    'GRANT', 'REVOKE', 'COMMIT', 'ROLLBACK', 'SAVEPOINT'
+)
+# Whole words only (`created_at` is a column, not CREATE); the scalar
+# REPLACE(...) function stays allowed, the `REPLACE INTO` statement does not.
+_DANGEROUS_KEYWORD_RE = re.compile(
+    r"\b(?:" + "|".join(k for k in _DANGEROUS_KEYWORDS if k != 'REPLACE') + r")\b|\bREPLACE\b(?!\s*\()",
+    re.IGNORECASE,
+)
+
+
+def strip_sql_literals(sql: str) -> str:
+    """
+    Return `sql` with comments removed and quoted strings/identifiers blanked.
+    """
+    return _SQL_NON_CODE_RE.sub(" ", sql)
+
+
 def validate_sql_security(sql: str) -> None:
     """
     验证SQL语句的安全性，只允许SELECT和WITH查询
@@ -30,25 +60,71 @@ def validate_sql_security(sql: str) -> None:
     Raises:
         ValueError: 如果SQL语句包含危险操作
     """
-    sql_upper = sql.strip().upper()
+    _check_sql_code(strip_sql_literals(sql).strip().rstrip(';').strip())
+
+
+def _check_sql_code(code: str) -> None:
+    """Security checks on SQL that already went through `strip_sql_literals`."""
+    sql_upper = code.upper()
     
     # 检查是否以SELECT或WITH开头（CTE查询）
     if not (sql_upper.startswith('SELECT') or sql_upper.startswith('WITH')):
         raise ValueError("安全限制：只允许SELECT或WITH查询语句")
+
+    # 只允许单条语句
+    if ';' in code:
+        raise ValueError("安全限制：只允许单条SQL语句")
     
-    # 检查是否包含危险的关键字
-    dangerous_keywords = [
-        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 
-        'TRUNCATE', 'REPLACE', 'MERGE', 'EXEC', 'EXECUTE', 'CALL',
-        'GRANT', 'REVOKE', 'COMMIT', 'ROLLBACK', 'SAVEPOINT'
-    ]
-    
-    for keyword in dangerous_keywords:
-        if keyword in sql_upper:
-            raise ValueError(f"安全限制：不允许包含 {keyword} 关键字")
+    # 检查是否包含危险的关键字（单次正则扫描）
+    match = _DANGEROUS_KEYWORD_RE.search(code)
+    if match:
+        raise ValueError(f"安全限制：不允许包含 {match.group(0).upper()} 关键字")
     
     # 系统表和系统函数访问已允许
 
+
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+
+def _has_outer_limit(code: str) -> bool:
+    """
+    True if `code` (already through `strip_sql_literals`) has a LIMIT outside
+    any parentheses; a LIMIT in a subquery or CTE does not bound the result.
+    """
+    for match in _LIMIT_RE.finditer(code):
+        pos = match.start()
+        if code.count("(", 0, pos) <= code.count(")", 0, pos):
+            return True
+    return False
+
+
+@lru_cache(maxsize=256)
+def prepare_sql(sql: str, n_results: int) -> str:
+    """
+    Validate a user SQL query and make sure it carries a LIMIT clause.
+
+    The query is stripped of comments/literals once and that form is shared by
+    the security check and LIMIT detection. Results are cached per (sql, n_results).
+
+    Args:
+        sql: SQL query (SELECT / WITH only)
+        n_results: LIMIT appended when the query has none
+
+    Returns:
+        Executable SQL without a trailing ';'.
+
+    Raises:
+        ValueError: 如果SQL语句包含危险操作
+    """
+    sql = sql.strip().rstrip(';').rstrip()
+    code = strip_sql_literals(sql).strip()
+    _check_sql_code(code)
+    if not _has_outer_limit(code):
+        # A trailing `--` comment would swallow the appended clause
+        sep = "\n" if "--" in sql else " "
+        sql = f"{sql}{sep}LIMIT {int(n_results)}"
+    return sql
+
 def tag_from_filters(
     mofid: Optional[str] = None,
     mofkey: Optional[str] = None,
@@ -145,133 +221,129 @@ def build_output_stem(mof: Any, idx: int) -> str:
     return _safe_basename(f"{prov}_{ident}_{idx}")
 
 
+# Source sub-folder for each MOFdb database (used when a row has no cif_path)
+_DATABASE_SUBDIRS = (
+    ("CoREMOF 2014", "core2014"),
+    ("CoREMOF 2019", "core2019"),
+    ("hMOF", "hmof"),
+    ("IZA", "iza"),
+    ("Tobacco", "tobacco"),
+    ("PCOD-syn", "pcod"),
+)
+
+# Upper bound for concurrent file copies in save_mofs (pure file I/O)
+SAVE_MAX_WORKERS = 16
+
+
+def _resolve_cif_path(mof: dict) -> Optional[Path]:
+    """
+    Locate the original CIF for a result row: `cif_path` if present, otherwise
+    a path constructed from database + name.
+    """
+    cif_path = mof.get('cif_path')
+    if cif_path:
+        return base_data_dir / cif_path
+
+    database = mof.get("database", "")
+    name = mof.get("name", "")
+    # Only try to construct path if we have a valid name (not idx0, idx1, etc.) and database
+    if name and not name.startswith("idx") and database:
+        for key, subdir in _DATABASE_SUBDIRS:
+            if key in database:
+                return base_data_dir / subdir / f"{name}.cif"
+    return None
+
+
+def _save_one_mof(
+    i: int,
+    mof: dict,
+    output_dir: Path,
+    output_formats: List[Format],
+) -> List[str]:
+    """
+    Write the requested files for one result row; return its warnings.
+    """
+    warnings = []
+    stem = build_output_stem(mof, i)
+    ident = _pick_identifier(mof, i)
+    full_cif_path = _resolve_cif_path(mof)
+
+    if full_cif_path is not None:
+        # Copy original files
+        for format_type in output_formats:
+            if format_type == 'cif':
+                src_file = full_cif_path
+            elif format_type == 'json':
+                src_file = full_cif_path.with_suffix('.json')
+            else:
+                continue
+            dst_file = output_dir / f"{stem}.{format_type}"
+
+            if src_file.exists():
+                try:
+                    if format_type == 'json':
+                        # Reformat JSON for better readability
+                        with open(src_file, 'r', encoding='utf-8') as src_f:
+                            data = json.load(src_f)
+                        with open(dst_file, 'w', encoding='utf-8') as dst_f:
+                            json.dump(data, dst_f, indent=2, ensure_ascii=False)
+                    else:
+                        shutil.copy2(src_file, dst_file)
+                except Exception as e:
+                    logging.error(f"Failed to copy {format_type} file for {ident}: {e}")
+            else:
+                warning_msg = f"Source file not found: {src_file} for {ident}"
+                logging.warning(warning_msg)
+                warnings.append(warning_msg)
+        return warnings
+
+    # Check if user requested CIF but result has no cif_path
+    if 'cif' in output_formats:
+        warning_msg = f"Result {i} ({ident}): User requested CIF format but no cif_path found in query result"
+        logging.warning(warning_msg)
+        warnings.append(warning_msg)
+
+    # No path construction possible: save query result as JSON
+    # (also the fallback when CIF was requested); written once.
+    if "json" in output_formats or 'cif' in output_formats:
+        json_file = output_dir / f"{stem}.json"
+        try:
+            with open(json_file, "w", encoding="utf-8") as f:
+                json.dump(mof, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Failed to save JSON file for {ident}: {e}")
+    return warnings
+
+
 def save_mofs(
     items: List[Any],
     output_dir: Path,
-    output_formats: List[Format] = ["cif", "json"]
+    output_formats: List[Format] = ["cif", "json"],
+    columns: Optional[Sequence[str]] = None,
 ) -> tuple[List[dict], List[str]]:
     """
     Save user requested file formats, return query results and warnings.
+
+    If `columns` is given, `items` are plain row tuples (cursor.description
+    order) and each row is turned into a dict exactly once, here.
+    Rows are written concurrently on a small thread pool (file copies are
+    independent); results and warnings keep the input order.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
-    warnings = []
-    
-    for i, mof in enumerate(items):
-        stem = build_output_stem(mof, i)
-        
-        cif_path = mof.get('cif_path')
-        
-        if cif_path:
-            # Has cif_path: copy original files
-            full_cif_path = base_data_dir / cif_path
-            base_path = full_cif_path.parent
-            base_name = full_cif_path.stem
-            
-            for format_type in output_formats:
-                if format_type == 'cif':
-                    src_file = full_cif_path
-                    dst_file = output_dir / f"{stem}.cif"
-                elif format_type == 'json':
-                    json_path = base_path / f"{base_name}.json"
-                    src_file = json_path
-                    dst_file = output_dir / f"{stem}.json"
-                else:
-                    continue
-                
-                if src_file.exists():
-                    try:
-                        if format_type == 'json':
-                            # Reformat JSON for better readability
-                            with open(src_file, 'r', encoding='utf-8') as src_f:
-                                data = json.load(src_f)
-                            with open(dst_file, 'w', encoding='utf-8') as dst_f:
-                                json.dump(data, dst_f, indent=2, ensure_ascii=False)
-                        else:
-                            import shutil
-                            shutil.copy2(src_file, dst_file)
-                    except Exception as e:
-                        logging.error(f"Failed to copy {format_type} file for {ident}: {e}")
-                else:
-                    warning_msg = f"Source file not found: {src_file} for {ident}"
-                    logging.warning(warning_msg)
-                    warnings.append(warning_msg)
-        else:
-            # No cif_path: try to construct path based on database and name
-            database = mof.get("database", "")
-            name = mof.get("name", "")
-            
-            # Only try to construct path if we have a valid name (not idx0, idx1, etc.) and database
-            constructed_cif_path = None
-            if name and not name.startswith("idx") and database:
-                # Construct path based on database type
-                if "CoREMOF 2014" in database:
-                    constructed_cif_path = f"core2014/{name}.cif"
-                elif "CoREMOF 2019" in database:
-                    constructed_cif_path = f"core2019/{name}.cif"
-                elif "hMOF" in database:
-                    constructed_cif_path = f"hmof/{name}.cif"
-                elif "IZA" in database:
-                    constructed_cif_path = f"iza/{name}.cif"
-                elif "Tobacco" in database:
-                    constructed_cif_path = f"tobacco/{name}.cif"
-                elif "PCOD-syn" in database:
-                    constructed_cif_path = f"pcod/{name}.cif"
-            
-            if constructed_cif_path:
-                full_cif_path = base_data_dir / constructed_cif_path
-                
-                # Try to copy original files if they exist
-                for format_type in output_formats:
-                    if format_type == 'cif':
-                        src_file = full_cif_path
-                        dst_file = output_dir / f"{stem}.cif"
-                    elif format_type == 'json':
-                        json_path = full_cif_path.with_suffix('.json')
-                        src_file = json_path
-                        dst_file = output_dir / f"{stem}.json"
-                    else:
-                        continue
-                    
-                    if src_file.exists():
-                        try:
-                            if format_type == 'json':
-                                # Reformat JSON for better readability
-                                with open(src_file, 'r', encoding='utf-8') as src_f:
-                                    data = json.load(src_f)
-                                with open(dst_file, 'w', encoding='utf-8') as dst_f:
-                                    json.dump(data, dst_f, indent=2, ensure_ascii=False)
-                            else:
-                                import shutil
-                                shutil.copy2(src_file, dst_file)
-                        except Exception as e:
-                            logging.error(f"Failed to copy {format_type} file for {ident}: {e}")
-                    else:
-                        warning_msg = f"Source file not found: {src_file} for {ident}"
-                        logging.warning(warning_msg)
-                        warnings.append(warning_msg)
-            else:
-                # No path construction possible: save query result as JSON
-                if "json" in output_formats:
-                    json_file = output_dir / f"{stem}.json"
-                    try:
-                        with open(json_file, "w", encoding="utf-8") as f:
-                            json.dump(mof, f, indent=2, ensure_ascii=False)
-                    except Exception as e:
-                        logging.error(f"Failed to save JSON file for {ident}: {e}")
-                
-                # Check if user requested CIF but result has no cif_path
-                if 'cif' in output_formats:
-                    warning_msg = f"Result {i} ({ident}): User requested CIF format but no cif_path found in query result"
-                    logging.warning(warning_msg)
-                    warnings.append(warning_msg)
-                    # Since CIF is not available, save query result as JSON instead
-                    json_file = output_dir / f"{stem}.json"
-                    try:
-                        with open(json_file, "w", encoding="utf-8") as f:
-                            json.dump(mof, f, indent=2, ensure_ascii=False)
-                    except Exception as e:
-                        logging.error(f"Failed to save JSON file for {ident}: {e}")
-    
-    # Return query results directly without any processing
-    return items, warnings
+    if columns is not None:
+        records = [dict(zip(columns, row)) for row in items]
+    else:
+        records = list(items)
+
+    def _save(args):
+        return _save_one_mof(args[0], args[1], output_dir, output_formats)
+
+    if len(records) > 1:
+        with ThreadPoolExecutor(max_workers=min(SAVE_MAX_WORKERS, len(records))) as ex:
+            per_item = list(ex.map(_save, enumerate(records)))
+    else:
+        per_item = [_save(arg) for arg in enumerate(records)]
 
+    warnings = [w for ws in per_item for w in ws]
+    # Return query results (as dicts) without any further processing
+    return records, warnings
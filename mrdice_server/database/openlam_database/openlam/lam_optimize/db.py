@@ -1,12 +1,51 @@
 import json
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import cached_property
 from typing import List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from pymatgen.core import Structure
 
+try:
+    import orjson
+
+    _json_loads = orjson.loads  # parses bytes directly, no str decode
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+# (connect, read) timeout in seconds for OpenLAM API calls
+REQUEST_TIMEOUT = (10, float(os.environ.get("OPENLAM_REQUEST_TIMEOUT", "60")))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """
+    Process-wide keep-alive session shared by all OpenLAM queries.
+
+    requests.Session is safe for concurrent GETs; the adapter pool is sized
+    for the worker threads that run retriever fetches.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # pool_connections: hosts kept; pool_maxsize: keep-alive sockets per host
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                _session = session
+    return _session
+
 
 class CrystalStructure:
     id: int
@@ -23,6 +62,11 @@ class CrystalStructure:
         self.submission_time = submission_time
         self.provider = provider
 
+    @cached_property
+    def submission_time_iso(self) -> str:
+        """ISO-8601 form of `submission_time`, formatted once per instance."""
+        return self.submission_time.isoformat()
+
     @staticmethod
     def request_iterate(params: dict) -> dict:
         access_key = os.environ.get("BOHRIUM_ACCESS_KEY")
@@ -32,30 +76,24 @@ class CrystalStructure:
             "Content-type": "application/json",
         }
         params["accessKey"] = access_key
-        rsp = requests.get(query_url, headers=headers, params=params)
+        rsp = _get_session().get(query_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
         if rsp.status_code != 200:
             raise RuntimeError("Response code %s: %s" % (rsp.status_code, rsp.text))
-        res = json.loads(rsp.text)
+        res = _json_loads(rsp.content)
         if res["code"] != 0:
             raise RuntimeError("Query error code %s: %s" % (res["code"], res["error"]["msg"]))
         data = res["data"]
         return data
 
-    @classmethod
-    def query_by_offset(
-        cls,
+    @staticmethod
+    def _build_params(
         formula: Optional[str] = None,
         min_energy: Optional[float] = None,
         max_energy: Optional[float] = None,
         min_submission_time: Optional[datetime] = None,
         max_submission_time: Optional[datetime] = None,
-        offset: int = 0,
-        limit: int = 10,
     ) -> dict:
-        params = {
-            "startId": offset,
-            "limit": limit,
-        }
+        params = {}
         if formula is not None:
             params["formula"] = formula
         if min_energy is not None:
@@ -66,19 +104,41 @@ class CrystalStructure:
             params["minSubmissionTime"] = min_submission_time.isoformat()
         if max_submission_time is not None:
             params["maxSubmissionTime"] = max_submission_time.isoformat()
+        return params
+
+    @classmethod
+    def _from_items(cls, items: List[dict]) -> List["CrystalStructure"]:
+        return [
+            cls(id=item["id"], formula=item["formula"],
+                structure=Structure.from_dict(_json_loads(item["structure"])),
+                energy=item["energy"],
+                submission_time=datetime.fromisoformat(item["submissionTime"]),
+                provider='openlam',
+                )
+            for item in items
+        ]
+
+    @classmethod
+    def query_by_offset(
+        cls,
+        formula: Optional[str] = None,
+        min_energy: Optional[float] = None,
+        max_energy: Optional[float] = None,
+        min_submission_time: Optional[datetime] = None,
+        max_submission_time: Optional[datetime] = None,
+        offset: int = 0,
+        limit: int = 10,
+    ) -> dict:
+        params = {
+            "startId": offset,
+            "limit": limit,
+        }
+        params.update(cls._build_params(formula, min_energy, max_energy,
+                                        min_submission_time, max_submission_time))
 
         data = cls.request_iterate(params)
         if data["items"] is not None:
-            structures = []
-            for item in data["items"]:
-                structure = cls(id=item["id"], formula=item["formula"],
-                                structure=Structure.from_dict(json.loads(item["structure"])),
-                                energy=item["energy"],
-                                submission_time=datetime.fromisoformat(item["submissionTime"]),
-                                provider='openlam',
-                                )
-                structures.append(structure)
-            data["items"] = structures
+            data["items"] = cls._from_items(data["items"])
         return data
 
     @classmethod
@@ -89,16 +149,29 @@ class CrystalStructure:
         max_energy: Optional[float] = None,
         min_submission_time: Optional[datetime] = None,
         max_submission_time: Optional[datetime] = None,
+        page_size: int = 100,
     ) -> List["CrystalStructure"]:
-        offset = 0
+        """
+        Fetch all matching structures, walking the `startId` keyset cursor.
+
+        The next page is requested on a background thread while the current
+        page is being parsed, so network latency overlaps Structure parsing.
+        """
+        base = cls._build_params(formula, min_energy, max_energy,
+                                 min_submission_time, max_submission_time)
+        base["limit"] = page_size
         structures = []
-        while True:
-            data = cls.query_by_offset(formula=formula, min_energy=min_energy, max_energy=max_energy,
-                                       min_submission_time=min_submission_time, max_submission_time=max_submission_time, offset=offset)
-            if data["items"] is None:
-                break
-            structures += data["items"]
-            if data["nextStartId"] == 0:
-                break
-            offset = data["nextStartId"]
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            # request_iterate mutates params (accessKey): pass a fresh dict per page
+            pending = prefetch.submit(cls.request_iterate, {**base, "startId": 0})
+            while pending is not None:
+                data = pending.result()
+                if data["items"] is None:
+                    break
+                next_start = data["nextStartId"]
+                pending = (
+                    prefetch.submit(cls.request_iterate, {**base, "startId": next_start})
+                    if next_start != 0 else None
+                )
+                structures += cls._from_items(data["items"])
         return structures
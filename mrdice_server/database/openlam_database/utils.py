@@ -1,12 +1,25 @@
 import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Literal
 from datetime import datetime, timezone
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json fallback
+    orjson = None
+
 
 # === OUTPUT TYPE ===
 Format = Literal["cif", "json"]
 
+# Upper bound for concurrent per-structure writes in save_structures_openlam
+SAVE_MAX_WORKERS = 32
+
 # Pre-built translation table for formula normalization (created once at module load)
 _FORMULA_TRANSLATION_TABLE = str.maketrans({
     # Subscript numbers: ₀₁₂₃₄₅₆₇₈₉ (U+2080-U+2089)
@@ -34,18 +47,32 @@ def normalize_formula(formula: Optional[str]) -> Optional[str]:
         H₂O → H2O
         Fe₂O₃ → Fe2O3
     """
-    if not formula:
+    # str.isascii() is O(1) in CPython (flag on the string object): plain
+    # formulas, the common case, are returned as-is without a translate pass.
+    if not formula or formula.isascii():
         return formula
     return formula.translate(_FORMULA_TRANSLATION_TABLE)
 
+@lru_cache(maxsize=1024)
 def parse_iso8601_utc(dt_str: str) -> datetime:
     """
     Parse an ISO 8601 UTC datetime string like '2024-01-01T00:00:00Z'.
+
+    Memoized (datetimes are immutable): searches repeat the same filter
+    strings.
     """
     if dt_str.endswith("Z"):
         dt_str = dt_str[:-1]
     return datetime.fromisoformat(dt_str).replace(tzinfo=timezone.utc)
 
+def _submission_time_iso(cs) -> str:
+    """
+    Cached ISO timestamp of a CrystalStructure (instances are reused via the query cache).
+    """
+    iso = getattr(cs, "submission_time_iso", None)
+    return iso if iso is not None else cs.submission_time.isoformat()
+
+
 def crystal_structure_to_dict(cs, drop_sites: bool = False) -> dict:
     """
     Convert a CrystalStructure to a dict.
@@ -70,11 +97,29 @@ def crystal_structure_to_dict(cs, drop_sites: bool = False) -> dict:
         "provider": cs.provider,
         "formula": cs.formula,
         "energy": cs.energy,
-        "submission_time": cs.submission_time.isoformat(),
+        "submission_time": _submission_time_iso(cs),
         "structure": struct_dict
     }
 
 
+def _dumps_indented(obj: dict) -> bytes:
+    """
+    Serialize to indented UTF-8 JSON bytes (orjson when available).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def _drop_sites(cs_dict: dict) -> dict:
+    """
+    Return a copy of a `crystal_structure_to_dict` result without site data.
+    """
+    cleaned = dict(cs_dict)
+    cleaned["structure"] = {k: v for k, v in cs_dict["structure"].items() if k != "sites"}
+    return cleaned
+
+
 def tag_from_filters(
     formula: Optional[str] = None,
     min_energy: Optional[float] = None,
@@ -101,10 +146,157 @@ def tag_from_filters(
     return tag[:max_len] or "openlam"
 
 
+# CIF rendering is pure-Python CPU work (GIL-bound); batches at least this
+# large are rendered on a process pool instead of the calling thread.
+CIF_PROCESS_POOL_MIN_ITEMS = 4
+
+# Opt-in P1 writer for simple structures (OPENLAM_FAST_CIF=1). Its output parses
+# to the same structure, but formula ordering and site labels differ from
+# pymatgen's CifWriter, which stays the default.
+FAST_CIF = os.getenv("OPENLAM_FAST_CIF", "0").strip().lower() in ("1", "true", "yes")
+
+def _get_cif_pool() -> ProcessPoolExecutor:
+    """
+    The server-wide process pool used for CIF rendering.
+
+    Imported lazily so pool workers, which import this module, do not load
+    the server package.
+    """
+    from mrdice_server.core.pool import get_process_pool
+
+    return get_process_pool()
+
+
+@lru_cache(maxsize=1)
+def _pymatgen_cif():
+    """
+    Import pymatgen's Structure / CifWriter once per process, on first use.
+
+    Kept out of module scope so importing these utils stays cheap.
+    """
+    from pymatgen.core import Structure
+    from pymatgen.io.cif import CifWriter
+
+    return Structure, CifWriter
+
+
+def _render_cif(structure_dict: dict) -> str:
+    """
+    Render a CIF string from a pymatgen Structure dict (process-pool worker).
+    """
+    Structure, CifWriter = _pymatgen_cif()
+    return str(CifWriter(Structure.from_dict(structure_dict)))
+
+
+def _fast_cif(structure_dict: dict) -> Optional[str]:
+    """
+    Write a P1 CIF directly from `Structure.as_dict()` output.
+
+    Covers the common OpenLAM case (ordered sites, plain elements, no site
+    properties) with the same fields CifWriter emits without symmetry
+    analysis. Returns None when the structure needs the full CifWriter.
+    """
+    lattice = structure_dict.get("lattice") or {}
+    if any(k not in lattice for k in ("a", "b", "c", "alpha", "beta", "gamma", "volume")):
+        return None
+
+    counts: dict = {}
+    rows = []
+    for site in structure_dict.get("sites", []):
+        species = site.get("species") or []
+        if len(species) != 1 or site.get("properties"):
+            return None
+        sp = species[0]
+        if sp.get("occu", 1) != 1 or sp.get("oxidation_state") or "element" not in sp:
+            return None
+        el = sp["element"]
+        idx = counts.get(el, 0)
+        counts[el] = idx + 1
+        x, y, z = site["abc"]
+        rows.append(f"  {el}  {el}{idx}  1  {x:.8f}  {y:.8f}  {z:.8f}  1")
+    if not rows:
+        return None
+
+    z_units = 0
+    for n in counts.values():
+        z_units = math.gcd(z_units, n)
+    reduced = "".join(f"{el}{n // z_units if n // z_units != 1 else ''}" for el, n in counts.items())
+    formula_sum = " ".join(f"{el}{n}" for el, n in counts.items())
+
+    lines = [
+        "# generated from a pymatgen Structure dict (P1)",
+        f"data_{reduced}",
+        "_symmetry_space_group_name_H-M   'P 1'",
+        f"_cell_length_a   {lattice['a']:.8f}",
+        f"_cell_length_b   {lattice['b']:.8f}",
+        f"_cell_length_c   {lattice['c']:.8f}",
+        f"_cell_angle_alpha   {lattice['alpha']:.8f}",
+        f"_cell_angle_beta   {lattice['beta']:.8f}",
+        f"_cell_angle_gamma   {lattice['gamma']:.8f}",
+        "_symmetry_Int_Tables_number   1",
+        f"_chemical_formula_structural   {reduced}",
+        f"_chemical_formula_sum   '{formula_sum}'",
+        f"_cell_volume   {lattice['volume']:.8f}",
+        f"_cell_formula_units_Z   {z_units}",
+        "loop_",
+        " _symmetry_equiv_pos_site_id",
+        " _symmetry_equiv_pos_as_xyz",
+        "  1  'x, y, z'",
+        "loop_",
+        " _atom_site_type_symbol",
+        " _atom_site_label",
+        " _atom_site_symmetry_multiplicity",
+        " _atom_site_fract_x",
+        " _atom_site_fract_y",
+        " _atom_site_fract_z",
+        " _atom_site_occupancy",
+        *rows,
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _render_cifs(items: List, full_dicts: List[dict], fast_cif: bool = False) -> List[str]:
+    """
+    Render CIF text for each structure.
+
+    Structures go through CifWriter, on the process pool for large batches;
+    with `fast_cif`, simple ones use `_fast_cif` instead.
+    """
+    texts: List[Optional[str]] = (
+        [_fast_cif(d["structure"]) for d in full_dicts] if fast_cif else [None] * len(items)
+    )
+    pending = [i for i, text in enumerate(texts) if text is None]
+    if not pending:
+        return texts
+
+    if len(pending) >= CIF_PROCESS_POOL_MIN_ITEMS:
+        try:
+            rendered = _get_cif_pool().map(_render_cif, [full_dicts[i]["structure"] for i in pending])
+            for i, text in zip(pending, rendered):
+                texts[i] = text
+            return texts
+        except Exception as e:
+            logging.warning(f"CIF process pool failed, rendering in-process: {e}")
+
+    _, CifWriter = _pymatgen_cif()
+    for i in pending:
+        texts[i] = str(CifWriter(items[i].structure))
+    return texts
+
+
+def structure_basename(cs, index: int) -> str:
+    """
+    File name (without extension) `save_structures_openlam` uses for the
+    `index`-th structure.
+    """
+    return f"{cs.provider or 'openlam'}_{cs.id}_{index}"
+
+
 def save_structures_openlam(
     items: List,
     output_dir: Path,
-    output_formats: List[Format] = ["cif"]
+    output_formats: List[Format] = ["cif"],
+    fast_cif: Optional[bool] = None,
 ) -> List[dict]:
     """
     Save OpenLAM crystal structures as full JSON and/or CIF files,
@@ -118,29 +310,41 @@ def save_structures_openlam(
         Folder to save files into.
     output_formats : list of {"json", "cif"}
         Format(s) to export for each structure.
+    fast_cif : bool, optional
+        Use the P1 writer `_fast_cif` for simple structures instead of
+        pymatgen's CifWriter. Defaults to FAST_CIF (OPENLAM_FAST_CIF).
 
     Returns
     -------
     List of cleaned structure dicts (e.g., without site data).
     """
-    from pymatgen.io.cif import CifWriter
-
-    cleaned = []
-
-    for i, cs in enumerate(items):
-        name = f"{cs.provider or 'openlam'}_{cs.id}_{i}"
+    # as_dict() walks every site: build each full dict once and derive the
+    # cleaned copy from it.
+    full_dicts = [crystal_structure_to_dict(cs, drop_sites=False) for cs in items]
+    if fast_cif is None:
+        fast_cif = FAST_CIF
+    cif_texts = _render_cifs(items, full_dicts, fast_cif) if "cif" in output_formats else None
 
-        # Save full JSON
+    def _payloads(i: int):
+        name = structure_basename(items[i], i)
         if "json" in output_formats:
-            full_dict = crystal_structure_to_dict(cs, drop_sites=False)
-            with open(output_dir / f"{name}.json", "w", encoding="utf-8") as f:
-                json.dump(full_dict, f, indent=2, ensure_ascii=False)
+            yield f"{name}.json", _dumps_indented(full_dicts[i])
+        if cif_texts is not None:
+            yield f"{name}.cif", cif_texts[i].encode("utf-8")
 
-        # Save CIF
-        if "cif" in output_formats:
-            CifWriter(cs.structure).write_file(output_dir / f"{name}.cif")
+    def _write_one(i: int) -> None:
+        # Serialized in memory; each file is written with a single write() call
+        # (json.dump / CifWriter.write_file issue many small writes).
+        for filename, data in _payloads(i):
+            (output_dir / filename).write_bytes(data)
 
-        # Collect cleaned version (for return)
-        cleaned.append(crystal_structure_to_dict(cs, drop_sites=True))
+    if len(items) <= 1:
+        for i in range(len(items)):
+            _write_one(i)
+    else:
+        # Files are independent: overlap the writes
+        with ThreadPoolExecutor(max_workers=min(SAVE_MAX_WORKERS, len(items))) as ex:
+            list(ex.map(_write_one, range(len(items))))
 
-    return cleaned
\ No newline at end of file
+    # Cleaned versions (for return), in input order
+    return [_drop_sites(d) for d in full_dicts]
@@ -2,8 +2,15 @@ import os
 import time
 import logging
 import json
+import atexit
+import hashlib
+import threading
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Iterable, Optional, Any, Tuple
+from typing import List, Dict, Iterable, Optional, Any, Sequence, Tuple
 from pymatgen.core import Composition, Structure
 from pymatgen.symmetry.groups import SpaceGroup
 
@@ -14,11 +21,21 @@ import oss2
 from dotenv import load_dotenv
 from oss2.credentials import EnvironmentVariableCredentialsProvider
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json fallback
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional speedup; pages are buffered and parsed whole
+    ijson = None
+
 # === LOAD ENV ===
 load_dotenv()
 
 
-DEFAULT_PROVIDERS = {
+DEFAULT_PROVIDERS = frozenset({
     # "aflow",
     "alexandria",
     # "aiida",
@@ -44,9 +61,9 @@ DEFAULT_PROVIDERS = {
     # "psdi",
     "tcod",
     "twodmatpedia",
-}
+})
 
-DEFAULT_SPG_PROVIDERS = {
+DEFAULT_SPG_PROVIDERS = frozenset({
     "alexandria",
     "cod",
     "mpdd",
@@ -54,25 +71,26 @@ DEFAULT_SPG_PROVIDERS = {
     "odbx",
     "oqmd",
     "tcod",
-}
+})
 
-DEFAULT_BG_PROVIDERS = {
+DEFAULT_BG_PROVIDERS = frozenset({
     "alexandria",
     "odbx",
     "oqmd",
     # "mcloudarchive",    ？？？？？？？
     "twodmatpedia",
-}
+})
 
-URLS_FROM_PROVIDERS = {
-    "aflow": ["https://aflow.org/API/optimade/"],
-    "alexandria": [
+# Immutable: shared directly with callers (see _provider_urls_from_names)
+URLS_FROM_PROVIDERS: Dict[str, Tuple[str, ...]] = {
+    "aflow": ("https://aflow.org/API/optimade/",),
+    "alexandria": (
         "https://alexandria.icams.rub.de/pbe",
         "https://alexandria.icams.rub.de/pbesol"
-    ],
-    "cod": ["https://www.crystallography.net/cod/optimade"],
-    "cmr": ["https://cmr-optimade.fysik.dtu.dk/"],
-    "mcloud": [
+    ),
+    "cod": ("https://www.crystallography.net/cod/optimade",),
+    "cmr": ("https://cmr-optimade.fysik.dtu.dk/",),
+    "mcloud": (
         "https://optimade.materialscloud.io/main/mc3d-pbe-v1",
         "https://optimade.materialscloud.io/main/mc2d",
         "https://optimade.materialscloud.io/main/2dtopo",
@@ -82,31 +100,31 @@ URLS_FROM_PROVIDERS = {
         "https://optimade.materialscloud.io/main/stoceriaitf",
         "https://optimade.materialscloud.io/main/autowannier",
         "https://optimade.materialscloud.io/main/tin-antimony-sulfoiodide"
-    ],
-    "mcloudarchive": [
+    ),
+    "mcloudarchive": (
         "https://optimade.materialscloud.org/archive/zk-gc",
         "https://optimade.materialscloud.org/archive/c8-gy",
         "https://optimade.materialscloud.org/archive/5p-vq",
         "https://optimade.materialscloud.org/archive/vg-ya"
-    ],
-    "mp": ["https://optimade.materialsproject.org/"],
-    "mpdd": ["http://mpddoptimade.phaseslab.org/"],
-    "mpds": ["https://api.mpds.io/"],
-    "mpod": ["http://mpod_optimade.cimav.edu.mx/"],
-    "nmd": ["https://nomad-lab.eu/prod/rae/optimade/"],
-    "odbx": [
+    ),
+    "mp": ("https://optimade.materialsproject.org/",),
+    "mpdd": ("http://mpddoptimade.phaseslab.org/",),
+    "mpds": ("https://api.mpds.io/",),
+    "mpod": ("http://mpod_optimade.cimav.edu.mx/",),
+    "nmd": ("https://nomad-lab.eu/prod/rae/optimade/",),
+    "odbx": (
         "https://optimade.odbx.science/",
         "https://optimade-misc.odbx.science/",
         "https://optimade-gnome.odbx.science/"
-    ],
-    "omdb": ["http://optimade.openmaterialsdb.se/"],
-    # "oqmd": ["https://oqmd.org/optimade/"],
-    "jarvis": ["https://jarvis.nist.gov/optimade/jarvisdft"],
-    "tcod": ["https://www.crystallography.net/tcod/optimade"],
-    "twodmatpedia": ["http://optimade.2dmatpedia.org/"]
+    ),
+    "omdb": ("http://optimade.openmaterialsdb.se/",),
+    # "oqmd": ("https://oqmd.org/optimade/",),
+    "jarvis": ("https://jarvis.nist.gov/optimade/jarvisdft",),
+    "tcod": ("https://www.crystallography.net/tcod/optimade",),
+    "twodmatpedia": ("http://optimade.2dmatpedia.org/",)
 }
 
-DROP_ATTRS = {
+DROP_ATTRS = frozenset({
     "cartesian_site_positions",
     "species_at_sites",
     "species",
@@ -122,9 +140,21 @@ DROP_ATTRS = {
     "_nmd_dft_geometries",
     "_mpdd_descriptors",
     "_mpdd_poscar",
-}
+})
 
 # === UTILS ===
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dumps_json(obj: Any, indent: bool = True) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes (orjson when available); non-JSON values are str()-ed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0, default=str)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=str).encode("utf-8")
+
+
 # Pre-built translation table for formula normalization (created once at module load)
 _FORMULA_TRANSLATION_TABLE = str.maketrans({
     # Subscript numbers: ₀₁₂₃₄₅₆₇₈₉ (U+2080-U+2089)
@@ -154,18 +184,24 @@ def normalize_formula(formula: str) -> str:
     """
     return formula.translate(_FORMULA_TRANSLATION_TABLE)
 
+@lru_cache(maxsize=4096)
+def _hill_formula(formula: str) -> str:
+    """Hill-order `formula` without spaces (pymatgen parsing is cached per formula)."""
+    return Composition(formula).hill_formula.replace(' ', '')
+
+@lru_cache(maxsize=2048)
 def hill_formula_filter(formula: str) -> str:
     # Normalize formula first (convert subscript/superscript to normal numbers)
     normalized = normalize_formula(formula)
-    hill_formula = Composition(normalized).hill_formula.replace(' ', '')
-    return f'chemical_formula_reduced="{hill_formula}"'
+    return f'chemical_formula_reduced="{_hill_formula(normalized)}"'
 
 # regex for chemical_formula_reduced="..."/'...'
 _CFR_EQ = re.compile(r'(?i)\bchemical_formula_reduced\b\s*=\s*([\'"])(.+?)\1')
 
 def normalize_cfr_in_filter(filter_str: str) -> str:
     """Normalize all chemical_formula_reduced=... clauses (0, 1, many)."""
-    if not filter_str:
+    # Cheap substring test first: most filters have no formula clause at all
+    if not filter_str or "chemical_formula_reduced" not in filter_str.lower():
         return filter_str
 
     def repl(m):
@@ -197,6 +233,48 @@ def normalize_cfr_in_filter(filter_str: str) -> str:
 
 
 # === Saver ===
+# Concurrent save_structures calls run on a dedicated anyio limiter per loop, sized
+# by core.config.get_thread_pool_size(); anyio's process-wide default is left alone.
+_save_limiters: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+
+
+def _get_save_limiter():
+    """Return the save-thread CapacityLimiter for the running loop."""
+    import asyncio
+
+    from anyio import CapacityLimiter
+
+    loop = asyncio.get_running_loop()
+    limiter = _save_limiters.get(loop)
+    if limiter is None:
+        from mrdice_server.core.config import get_thread_pool_size
+
+        limiter = _save_limiters[loop] = CapacityLimiter(get_thread_pool_size())
+    return limiter
+
+
+# Writer threads shared by all save_structures calls: the files of a render
+# window are written in parallel instead of one after another.
+SAVE_WRITE_WORKERS = 8
+_write_pool = None
+_write_pool_lock = threading.Lock()
+
+
+def _get_write_pool():
+    """Create (once) and return the shared file-writer thread pool."""
+    global _write_pool
+    if _write_pool is None:
+        with _write_pool_lock:
+            if _write_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                _write_pool = ThreadPoolExecutor(
+                    max_workers=SAVE_WRITE_WORKERS, thread_name_prefix="optimade-write"
+                )
+    return _write_pool
+
+
+@lru_cache(maxsize=512)
 def _provider_name_from_url(url: str) -> str:
     """Turn provider URL into a filesystem-safe name."""
     parsed = urlparse(url)
@@ -250,6 +328,32 @@ def normalize_and_collect(results_list: List[Any]) -> Tuple[List[dict], Dict[str
     return norm_results, stats
 
 
+def _round_robin_fill(assigned: List[int], caps: List[int], left: int) -> int:
+    """
+    Add up to `left` units to `assigned` one URL at a time in list order,
+    skipping URLs already at their cap, without iterating per unit.
+
+    Each pass hands one unit to every URL that still has headroom, so whole
+    passes are applied in bulk (bounded by the smallest headroom) and only the
+    final partial pass goes to the first URLs in order. Returns the units that
+    could not be placed.
+    """
+    while left > 0:
+        open_idx = [i for i, cap in enumerate(caps) if cap > assigned[i]]
+        if not open_idx:
+            break
+        k = len(open_idx)
+        rounds = min(left // k, min(caps[i] - assigned[i] for i in open_idx))
+        if rounds == 0:
+            for i in open_idx[:left]:
+                assigned[i] += 1
+            return 0
+        for i in open_idx:
+            assigned[i] += rounds
+        left -= rounds * k
+    return left
+
+
 def distribute_quota_fair(stats: Dict[str, Dict[str, int]], n_results: int) -> Dict[str, Dict[str, int]]:
     """
     Strict fairness:
@@ -258,15 +362,19 @@ def distribute_quota_fair(stats: Dict[str, Dict[str, int]], n_results: int) -> D
       3) If some clauses can't absorb their fair share, *water-fill across clauses* to equalize totals,
          and for each unit given to a clause, assign it round-robin across that clause's residual URLs.
     - Preserves insertion order of `stats` (providers, then URLs).
+    - Water levels are raised tier by tier in bulk, so the cost does not grow with `n_results`.
     """
     if not stats or n_results <= 0:
         return {}
 
     clauses = list(stats.keys())
+    # URL order and caps per clause, read once and reused by every step below
+    clause_urls = {c: tuple(stats[c].keys()) for c in clauses}
+    url_caps = {c: tuple(stats[c].values()) for c in clauses}
     # Clause capacities (sum of URL caps)
-    clause_caps = {c: sum(stats[c].values()) for c in clauses}
+    clause_caps = {c: sum(url_caps[c]) for c in clauses}
     active_clauses = [c for c in clauses if clause_caps[c] > 0]
-    plan: Dict[str, Dict[str, int]] = {c: {u: 0 for u in stats[c].keys()} for c in clauses}
+    plan: Dict[str, Dict[str, int]] = {c: dict.fromkeys(clause_urls[c], 0) for c in clauses}
 
     if not active_clauses:
         return plan
@@ -288,36 +396,25 @@ def distribute_quota_fair(stats: Dict[str, Dict[str, int]], n_results: int) -> D
         if quota_c <= 0:
             continue
 
-        urls = list(stats[c].keys())
-        caps = [stats[c][u] for u in urls]
-        n_urls = len(urls)
+        caps = url_caps[c]
+        n_urls = len(caps)
 
         # equal split
         base_url = quota_c // n_urls
         rem_url  = quota_c %  n_urls
 
-        assigned = [0] * n_urls
-        for ui, u in enumerate(urls):
-            want = base_url + (1 if ui < rem_url else 0)
-            give = min(want, caps[ui])
-            assigned[ui] = give
+        assigned = [
+            min(base_url + (1 if ui < rem_url else 0), caps[ui])
+            for ui in range(n_urls)
+        ]
 
         # intra-clause water-fill to reach quota_c if some URLs had headroom
-        assigned_sum = sum(assigned)
-        left = max(0, quota_c - assigned_sum)
+        left = quota_c - sum(assigned)
         if left > 0:
-            residuals = [caps[i] - assigned[i] for i in range(n_urls)]
-            ui = 0
-            while left > 0 and any(r > 0 for r in residuals):
-                if residuals[ui] > 0:
-                    assigned[ui] += 1
-                    residuals[ui] -= 1
-                    left -= 1
-                ui = (ui + 1) % n_urls
+            _round_robin_fill(assigned, caps, left)
 
         # write back
-        for ui, u in enumerate(urls):
-            plan[c][u] = assigned[ui]
+        plan[c] = dict(zip(clause_urls[c], assigned))
         totals[c] = sum(assigned)
 
     # --- Step 3: clause-level water-filling (equalize across providers), then per-clause URL RR
@@ -325,77 +422,163 @@ def distribute_quota_fair(stats: Dict[str, Dict[str, int]], n_results: int) -> D
     if remaining <= 0:
         return plan
 
-    # per-clause URL residual lists + round-robin pointer
-    residual_urls: Dict[str, List[List]] = {}
-    next_url_idx: Dict[str, int] = {}
-    for c in active_clauses:
-        lst = []
-        for u in stats[c].keys():
-            res = stats[c][u] - plan[c][u]
-            if res > 0:
-                lst.append([u, res])  # [url, residual]
-        if lst:
-            residual_urls[c] = lst
-            next_url_idx[c] = 0
-
-    # helper: one unit to clause c → assign to next residual URL in that clause (RR)
-    def give_one_to_clause(c: str) -> bool:
-        urls = residual_urls.get(c)
-        if not urls:
-            return False
-        idx = next_url_idx[c] % len(urls)
-        u, r = urls[idx]
-        plan[c][u] += 1
-        totals[c] += 1
-        r -= 1
-        if r == 0:
-            urls.pop(idx)
-            next_url_idx[c] = 0 if not urls else (idx % len(urls))
-            if not urls:
-                residual_urls.pop(c, None)
-        else:
-            urls[idx][1] = r
-            next_url_idx[c] = (idx + 1) % len(urls)
-        return True
-
-    # clause-level water-filling: always raise clauses with the current minimum total first
-    while remaining > 0 and residual_urls:
-        # among clauses that still have residual URLs, find current minimal total
-        candidates = [c for c in active_clauses if c in residual_urls]
+    residual = {c: clause_caps[c] - totals[c] for c in active_clauses}
+    raised = dict(totals)
+
+    # always raise the clauses at the current minimum total first; each tier step
+    # lifts all tied clauses together until one saturates, the next tier is
+    # reached, or `remaining` runs out
+    while remaining > 0:
+        candidates = [c for c in active_clauses if residual[c] > 0]
         if not candidates:
             break
-        min_total = min(totals[c] for c in candidates)
-
-        progressed = False
-        for c in active_clauses:  # preserve insertion order
-            if remaining == 0:
-                break
-            if c not in residual_urls:
-                continue
-            if totals[c] == min_total:
-                if give_one_to_clause(c):
-                    remaining -= 1
-                    progressed = True
-
-        if not progressed:
-            # no clause at min_total could accept more (capacity bound) → stop
+        min_total = min(raised[c] for c in candidates)
+        tied = [c for c in candidates if raised[c] == min_total]  # preserves insertion order
+        higher = [raised[c] for c in candidates if raised[c] > min_total]
+
+        step = min(remaining // len(tied), min(residual[c] for c in tied))
+        if higher:
+            step = min(step, min(higher) - min_total)
+        if step == 0:
+            # fewer units than tied clauses: one each, in insertion order
+            for c in tied[:remaining]:
+                raised[c] += 1
+                residual[c] -= 1
             break
+        for c in tied:
+            raised[c] += step
+            residual[c] -= step
+        remaining -= step * len(tied)
+
+    # each clause's extra units go round-robin across its URLs' residual caps
+    for c in active_clauses:
+        extra = raised[c] - totals[c]
+        if extra <= 0:
+            continue
+        assigned = list(plan[c].values())
+        _round_robin_fill(assigned, url_caps[c], extra)
+        plan[c] = dict(zip(clause_urls[c], assigned))
+        totals[c] = raised[c]
 
     return plan
 
 
-def save_structures(results: Dict, output_folder: Path, as_cif: bool, plan: Dict[str, Dict[str, int]]):
+# CIF conversion is CPU-bound pymatgen work: batches of at least this many
+# structures are rendered on a process pool instead of the saver thread.
+CIF_PROCESS_POOL_MIN_ITEMS = 4
+
+def _get_cif_pool():
+    """
+    The server-wide process pool used for CIF rendering.
+
+    Imported lazily so CIF process-pool workers, which import this module,
+    do not load the server package.
+    """
+    from mrdice_server.core.pool import get_process_pool
+
+    return get_process_pool()
+
+
+def _cif_bytes(lattice: list, species: list, coords: list) -> bytes:
+    """
+    Render a CIF from OPTIMADE lattice vectors, species and Cartesian positions
+    (process-pool worker).
+    """
+    cif_content = Structure(
+        lattice=lattice,
+        species=species,
+        coords=coords,
+        coords_are_cartesian=True,
+    ).to(fmt='cif')
+    if not cif_content or not cif_content.strip():
+        raise ValueError("CIF content is empty")
+    return cif_content.encode("utf-8")
+
+
+def _cif_job(sd: dict) -> Any:
+    """
+    Return the (lattice, species, coords) arguments for `_cif_bytes`, or a
+    ValueError saying why the structure cannot be rendered. Malformed entries
+    are rejected here, before pymatgen (or a pool round-trip) is paid for them.
+    """
+    attrs = sd.get("attributes") if isinstance(sd, dict) else None
+    if not isinstance(attrs, dict):
+        return ValueError("missing attributes")
+    lattice = attrs.get("lattice_vectors")
+    species = attrs.get("species_at_sites")
+    coords = attrs.get("cartesian_site_positions")
+    if not (
+        isinstance(lattice, list) and len(lattice) == 3
+        and all(isinstance(row, list) and len(row) == 3 and None not in row for row in lattice)
+    ):
+        return ValueError("missing or non-periodic lattice_vectors")
+    if not species or not coords:
+        return ValueError("no sites (species_at_sites / cartesian_site_positions)")
+    if len(species) != len(coords):
+        return ValueError(f"{len(species)} species for {len(coords)} positions")
+    return lattice, species, coords
+
+
+def _render_payloads(structures: List[dict], as_cif: bool) -> List[Any]:
+    """
+    Serialize structures for saving: bytes per structure, or the exception raised.
+    """
+    def _try(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            return e
+
+    if not as_cif:
+        return [_try(_dumps_json, sd) for sd in structures]
+
+    jobs: List[Any] = [_cif_job(sd) for sd in structures]
+
+    n_jobs = sum(1 for j in jobs if not isinstance(j, Exception))
+    if n_jobs < CIF_PROCESS_POOL_MIN_ITEMS:
+        return [j if isinstance(j, Exception) else _try(_cif_bytes, *j) for j in jobs]
+
+    from concurrent.futures.process import BrokenProcessPool
+
+    pool = _get_cif_pool()
+    futures = [j if isinstance(j, Exception) else pool.submit(_cif_bytes, *j) for j in jobs]
+    out: List[Any] = []
+    for job, fut in zip(jobs, futures):
+        if isinstance(fut, Exception):
+            out.append(fut)
+            continue
+        try:
+            out.append(fut.result())
+        except BrokenProcessPool as e:
+            logging.warning(f"[save] CIF process pool failed, rendering in-process: {e}")
+            out.append(_try(_cif_bytes, *job))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+def save_structures(
+    results: Dict,
+    output_folder: Path,
+    as_cif: bool,
+    plan: Dict[str, Dict[str, int]],
+    folder_ready: bool = False,
+):
     """
     Walk OPTIMADE aggregated results and write per-provider files using per-URL quotas from `plan`.
+    Pass `folder_ready=True` when the caller already created `output_folder`.
     Returns files list, warnings list, providers_seen list, cleaned_structures list.
     """
-    output_folder.mkdir(parents=True, exist_ok=True)
+    if not folder_ready:
+        output_folder.mkdir(parents=True, exist_ok=True)
     files: List[str] = []
     warnings: List[str] = []
     providers_seen: List[str] = []
     cleaned_structures: List[dict] = []
 
     seen_ids: set[str] = set()
+    write_pool = _get_write_pool()
+    suffix = "cif" if as_cif else "json"
 
     structures_by_filter = results.get("structures", {})
     if not isinstance(structures_by_filter, dict):
@@ -405,10 +588,11 @@ def save_structures(results: Dict, output_folder: Path, as_cif: bool, plan: Dict
     for clause, structures_by_url in structures_by_filter.items():
         if not isinstance(structures_by_url, dict):
             continue
+        clause_plan = plan.get(clause) or {}
 
         for provider_url, content in structures_by_url.items():
             # per-URL quota from plan
-            quota = int(plan.get(clause, {}).get(provider_url, 0))
+            quota = int(clause_plan.get(provider_url, 0))
             if quota <= 0:
                 continue
 
@@ -416,64 +600,69 @@ def save_structures(results: Dict, output_folder: Path, as_cif: bool, plan: Dict
             providers_seen.append(provider_name)
 
             data_list = (content or {}).get("data", []) or []
-            logging.info(f"[save] {provider_name}: {len(data_list)} candidates, quota={quota}")
+            # Per-URL / per-structure logs below use %-style args: skipped unless the level is enabled
+            logging.info("[save] %s: %d candidates, quota=%d", provider_name, len(data_list), quota)
 
             saved = 0
-            for structure_data in data_list:
-                if saved >= quota:
-                    break
-
-                orig_id = str(structure_data.get("id", ""))
-                if not orig_id:
-                    logging.warning(f"[save] missing id for {provider_name}; skipping")
-                    continue
-                if orig_id in seen_ids:
-                    logging.debug(f"[save] duplicate skipped: {orig_id}")
-                    continue
-
-                # ---------- file write ----------
-                suffix = "cif" if as_cif else "json"
-                filename = f"{provider_name}_{orig_id}_{saved}.{suffix}"
-                file_path = output_folder / filename
-
-                try:
-                    if as_cif:
-                        cif_content = Structure(
-                            lattice=structure_data['attributes']['lattice_vectors'],
-                            species=structure_data['attributes']['species_at_sites'],
-                            coords=structure_data['attributes']['cartesian_site_positions'],
-                            coords_are_cartesian=True,
-                        ).to(fmt='cif')
-                        if not cif_content or not cif_content.strip():
-                            raise ValueError("CIF content is empty")
-                        file_path.write_text(cif_content)
-                    else:
-                        file_path.write_text(json.dumps(structure_data, indent=2, ensure_ascii=False))
-
-                    logging.debug(f"[save] wrote {file_path}")
+            pos = 0
+            while saved < quota and pos < len(data_list):
+                # Next window of candidates, just enough to fill the remaining quota;
+                # render or write failures are replaced from the following window.
+                window: Dict[str, dict] = {}
+                while pos < len(data_list) and len(window) < quota - saved:
+                    structure_data = data_list[pos]
+                    pos += 1
+                    orig_id = str(structure_data.get("id", ""))
+                    if not orig_id:
+                        logging.warning("[save] missing id for %s; skipping", provider_name)
+                        continue
+                    if orig_id in seen_ids or orig_id in window:
+                        logging.debug("[save] duplicate skipped: %s", orig_id)
+                        continue
+                    window[orig_id] = structure_data
+
+                # ---------- render, then write the window on the writer pool ----------
+                payloads = _render_payloads(list(window.values()), as_cif)
+                writes: List[Tuple[str, dict, Path, Any]] = []
+                for (orig_id, structure_data), payload in zip(window.items(), payloads):
+                    if isinstance(payload, Exception):
+                        msg = f"Failed to save structure from {provider_name} #{orig_id}: {payload}"
+                        logging.warning(msg)
+                        warnings.append(msg)
+                        # don't mark seen; let another url try this id
+                        continue
+                    file_path = output_folder / f"{provider_name}_{orig_id}_{saved + len(writes)}.{suffix}"
+                    writes.append(
+                        (orig_id, structure_data, file_path, write_pool.submit(file_path.write_bytes, payload))
+                    )
+
+                for orig_id, structure_data, file_path, future in writes:
+                    try:
+                        future.result()
+                    except OSError as e:
+                        msg = f"Failed to write {file_path}: {e}"
+                        logging.warning(msg)
+                        warnings.append(msg)
+                        # no file behind it: don't mark seen or count it
+                        continue
+                    logging.debug("[save] wrote %s", file_path)
                     files.append(str(file_path))
-                except Exception as e:
-                    msg = f"Failed to save structure from {provider_name} #{orig_id}: {e}"
-                    logging.warning(msg)
-                    warnings.append(msg)
-                    # don't mark seen; let another url try this id
-                    continue
-
-                # ---------- cleaned copy ----------
-                try:
-                    sd = dict(structure_data)
-                    attrs = dict(sd.get("attributes", {}) or {})
-                    for k in DROP_ATTRS:
-                        attrs.pop(k, None)
-                    sd["attributes"] = attrs
-                    sd["provider_url"] = provider_url   # keep as you had it
-                    cleaned_structures.append(sd)
-                except Exception as e:
-                    logging.warning(f"[save] clean-copy failed for {provider_name} #{orig_id}: {e}")
-
-                # only after successful write:
-                seen_ids.add(orig_id)
-                saved += 1
+
+                    # ---------- cleaned copy ----------
+                    try:
+                        attrs = {
+                            k: v for k, v in (structure_data.get("attributes") or {}).items()
+                            if k not in DROP_ATTRS
+                        }
+                        cleaned_structures.append(
+                            {**structure_data, "attributes": attrs, "provider_url": provider_url}
+                        )
+                    except Exception as e:
+                        logging.warning("[save] clean-copy failed for %s #%s: %s", provider_name, orig_id, e)
+
+                    # only after the file is written:
+                    seen_ids.add(orig_id)
+                    saved += 1
 
             if saved < quota:
                 warnings.append(
@@ -485,6 +674,11 @@ def save_structures(results: Dict, output_folder: Path, as_cif: bool, plan: Dict
     return files, warnings, providers_seen, cleaned_structures
 
 
+_FILTER_TAG_TRANS = str.maketrans({'"': None, "'": None, "=": None, " ": "_", ",": "-"})
+_FILTER_TAG_UNSAFE = re.compile(r"[^\w-]")
+
+
+@lru_cache(maxsize=1024)
 def filter_to_tag(filter_str: str, max_len: int = 30) -> str:
     """
     Convert an OPTIMADE filter string into a short, filesystem-safe tag.
@@ -501,24 +695,36 @@ def filter_to_tag(filter_str: str, max_len: int = 30) -> str:
     str
         A short, sanitized tag derived from the filter.
     """
-    # Remove surrounding spaces and quotes
-    tag = filter_str.strip().replace('"', '').replace("'", "")
-
-    # Replace spaces, commas, and equals with underscores/dashes
-    tag = tag.replace(" ", "_").replace(",", "-").replace("=", "")
+    # Drop quotes and '=', spaces → '_', commas → '-' (one pass)
+    tag = filter_str.strip().translate(_FILTER_TAG_TRANS)
 
     # Keep only safe characters: alphanumeric, underscore, dash
-    tag = "".join(c for c in tag if c.isalnum() or c in "_-")
+    # (\w is Unicode-aware, matching str.isalnum() plus '_')
+    tag = _FILTER_TAG_UNSAFE.sub("", tag)
+
+    # Limit length; fallback if everything gets stripped
+    return tag[:max_len] or "filter"
 
-    # Limit length
-    if len(tag) > max_len:
-        tag = tag[:max_len]
 
-    # Fallback if everything gets stripped
-    return tag or "filter"
 
+_TS_FMT = "%Y%m%d_%H%M%S"
 
+@lru_cache(maxsize=1024)
+def _folder_stem(tag_source: str, hash_source: str) -> Tuple[str, str]:
+    """(filesystem-safe tag, 8-hex discriminator) for an output folder, cached per query."""
+    from mrdice_server.core.utils import short_hash
 
+    return filter_to_tag(tag_source), short_hash(hash_source)
+
+
+def _make_out_folder(base_output_dir: Path, tag_source: str, hash_source: str) -> Path:
+    """Return `<base>/<tag>_<YYYYmmdd_HHMMSS>_<hash>` (the base directory is created)."""
+    base_output_dir.mkdir(parents=True, exist_ok=True)
+    tag, short = _folder_stem(tag_source, hash_source)
+    return base_output_dir / f"{tag}_{time.strftime(_TS_FMT)}_{short}"
+
+
+@lru_cache(maxsize=256)
 def _hm_symbol_from_number(spg_number: int) -> Optional[str]:
     """Return the short Hermann–Mauguin symbol (e.g. 'Im-3m') for a space-group number."""
     try:
@@ -527,6 +733,13 @@ def _hm_symbol_from_number(spg_number: int) -> Optional[str]:
         logging.warning(f"[spg] cannot map number {spg_number} to H–M symbol: {e}")
         return None
 
+# TCOD spacing rules used by _to_tcod_format, compiled once
+_TCOD_SLASH = re.compile(r'/([A-Za-z]+)')
+_TCOD_LETLET = re.compile(r'(?<=[A-Za-z])(?=[A-Za-z])')
+_TCOD_LETDIG = re.compile(r'(?<=[A-Za-z])(?=\d)|(?<=\d)(?=[A-Za-z])')
+_TCOD_MINUS = re.compile(r'\s*-\s*(?=\d)')
+
+@lru_cache(maxsize=256)
 def _to_tcod_format(hm: str) -> str:
     """
     Convert a short Hermann–Mauguin symbol to TCOD spacing.
@@ -537,41 +750,47 @@ def _to_tcod_format(hm: str) -> str:
     """
     s = hm.strip()
     # 1) Expand groups after '/' → '/m m m', '/mm' → '/m m', '/mc' → '/m c', etc.
-    s = re.sub(r'/([A-Za-z]+)', lambda m: '/' + ' '.join(m.group(1)), s)
+    s = _TCOD_SLASH.sub(lambda m: '/' + ' '.join(m.group(1)), s)
     # 2) Put spaces between ANY two consecutive letters (F d, P m, …)
-    s = re.sub(r'(?<=[A-Za-z])(?=[A-Za-z])', ' ', s)
+    s = _TCOD_LETLET.sub(' ', s)
     # 3) Put spaces between letter↔digit transitions (P4 → P 4, 4m → 4 m)
-    s = re.sub(r'(?<=[A-Za-z])(?=\d)|(?<=\d)(?=[A-Za-z])', ' ', s)
+    s = _TCOD_LETDIG.sub(' ', s)
     # 4) Put a space only *before* the minus (attach '-' to the number): 'm-3' -> 'm -3'
-    s = re.sub(r'\s*-\s*(?=\d)', ' -', s)
+    s = _TCOD_MINUS.sub(' -', s)
     # 5) Collapse multiple spaces
     return ' '.join(s.split())
 
+# Provider → space-group clause template: {n} is the IT number, {hm} the short
+# Hermann–Mauguin symbol, {tcod} the same symbol in TCOD spacing.
+_SPG_CLAUSE_TEMPLATES: Dict[str, str] = {
+    "alexandria": "_alexandria_space_group={n}",
+    "nmd":        "_nmd_dft_spacegroup={n}",
+    "mpdd":       "_mpdd_spacegroupn={n}",
+    "odbx":       "_gnome_space_group_it_number={n}",
+    "oqmd":       '_oqmd_spacegroup="{hm}"',
+    "tcod":       '_tcod_sg="{tcod}"',
+    "cod":        '_cod_sg="{tcod}"',
+}
+
+
 def get_spg_filter_map(spg_number: int, providers: Iterable[str]) -> Dict[str, str]:
     """
     Map provider name → space-group filter clause for that provider.
     Handles alexandria, nmd, mpdd, odbx, oqmd, tcod, cod.
     """
-    hm = _hm_symbol_from_number(spg_number)
+    templates = {p: _SPG_CLAUSE_TEMPLATES[p] for p in providers if p in _SPG_CLAUSE_TEMPLATES}
 
-    name_map = {
-        "alexandria": lambda: f"_alexandria_space_group={spg_number}",
-        "nmd":        lambda: f"_nmd_dft_spacegroup={spg_number}",
-        "mpdd":       lambda: f"_mpdd_spacegroupn={spg_number}",
-        "odbx":       lambda: f"_gnome_space_group_it_number={spg_number}",
-        "oqmd":       lambda: f'_oqmd_spacegroup="{hm}"' if hm else "",
-        "tcod":       lambda: f'_tcod_sg="{_to_tcod_format(hm)}"' if hm else "",
-        "cod":        lambda: f'_cod_sg="{_to_tcod_format(hm)}"' if hm else "",
-    }
+    # The H–M lookup is only needed by symbol-based providers
+    hm = tcod = None
+    if any("{n}" not in t for t in templates.values()):
+        hm = _hm_symbol_from_number(spg_number)
+        tcod = _to_tcod_format(hm) if hm else None
 
-    out: Dict[str, str] = {}
-    for p in providers:
-        if p not in name_map:
-            continue
-        clause = name_map[p]()
-        if clause:
-            out[p] = clause
-    return out
+    return {
+        p: template.format(n=spg_number) if "{n}" in template else template.format(hm=hm, tcod=tcod)
+        for p, template in templates.items()
+        if hm or "{n}" in template  # symbol-based providers are skipped if the lookup failed
+    }
 
 
 def _range_clause(prop: str, min_bg: Optional[float], max_bg: Optional[float]) -> str:
@@ -583,6 +802,15 @@ def _range_clause(prop: str, min_bg: Optional[float], max_bg: Optional[float]) -
         parts.append(f"{prop}<={max_bg}")
     return " AND ".join(parts) if parts else ""  # empty means 'no constraint'
 
+# Provider → band-gap property name
+_BG_PROPERTY_NAMES: Dict[str, str] = {
+    "alexandria": "_alexandria_band_gap",
+    "odbx": "_gnome_bandgap",
+    "oqmd": "_oqmd_band_gap",
+    "mcloudarchive": "_mcloudarchive_band_gap",
+    "twodmatpedia": "_twodmatpedia_band_gap",
+}
+
 def get_bandgap_filter_map(
     min_bg: Optional[float],
     max_bg: Optional[float],
@@ -593,26 +821,17 @@ def get_bandgap_filter_map(
     Providers without a known property are omitted.
     If providers is None, uses DEFAULT_BG_PROVIDERS.
     """
-    providers = set(providers) if providers else DEFAULT_BG_PROVIDERS
+    if not providers:
+        providers = DEFAULT_BG_PROVIDERS
+    elif not isinstance(providers, (set, frozenset)):
+        providers = frozenset(providers)
 
-    name_map = {
-        "alexandria": "_alexandria_band_gap",
-        "odbx": "_gnome_bandgap",             
-        "oqmd": "_oqmd_band_gap",
-        "mcloudarchive": "_mcloudarchive_band_gap",
-        "twodmatpedia": "_twodmatpedia_band_gap",
+    return {
+        p: clause
+        for p in providers
+        if (prop := _BG_PROPERTY_NAMES.get(p)) and (clause := _range_clause(prop, min_bg, max_bg))
     }
 
-    out: Dict[str, str] = {}
-    for p in providers:
-        prop = name_map.get(p)
-        if not prop:
-            continue
-        clause = _range_clause(prop, min_bg, max_bg)
-        if clause:
-            out[p] = clause
-    return out
-
 def build_provider_filters(base: Optional[str], provider_map: Dict[str, str]) -> Dict[str, str]:
     """
     Combine a base OPTIMADE filter with per-provider clauses.
@@ -631,12 +850,26 @@ def build_provider_filters(base: Optional[str], provider_map: Dict[str, str]) ->
     """
     b = (base or "").strip()
     return {
-        p: f"({b}) AND ({c.strip()})" if b and c.strip() else (b or c.strip())
+        p: f"({b}) AND ({cs})" if b else cs
         for p, c in provider_map.items()
-        if c and c.strip()  # skip empty clauses
+        if c and (cs := c.strip())  # skip empty clauses
     }
 
 
+@lru_cache(maxsize=512)
+def _spg_provider_filters(base: str, spg_number: int, providers: frozenset) -> Tuple[Tuple[str, str], ...]:
+    """Cached `build_provider_filters(base, get_spg_filter_map(...))` as (provider, clause) pairs."""
+    return tuple(build_provider_filters(base, get_spg_filter_map(spg_number, providers)).items())
+
+
+@lru_cache(maxsize=512)
+def _bandgap_provider_filters(
+    base: str, min_bg: Optional[float], max_bg: Optional[float], providers: frozenset
+) -> Tuple[Tuple[str, str], ...]:
+    """Cached `build_provider_filters(base, get_bandgap_filter_map(...))` as (provider, clause) pairs."""
+    return tuple(build_provider_filters(base, get_bandgap_filter_map(min_bg, max_bg, providers)).items())
+
+
 def get_base_urls() -> List[str]:
     """
     Get base OPTIMADE URLs for all known providers.
@@ -652,122 +885,595 @@ def get_base_urls() -> List[str]:
 # High-level query helpers
 # =========================
 
-def _provider_urls_from_names(providers: Iterable[str]) -> Dict[str, List[str]]:
+@lru_cache(maxsize=64)
+def _sorted_providers(providers: frozenset) -> List[str]:
+    """Sorted provider names for manifests (the default sets hit the cache)."""
+    return sorted(providers)
+
+
+def _provider_urls_from_names(providers: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
     """
     Build provider -> base_urls mapping from provider names.
     """
-    out: Dict[str, List[str]] = {}
-    for p in providers:
-        urls = [u for u in URLS_FROM_PROVIDERS.get(p, [])]
-        if urls:
-            out[p] = urls
-    return out
+    return {p: URLS_FROM_PROVIDERS[p] for p in providers if URLS_FROM_PROVIDERS.get(p)}
 
 
-async def fetch_structures_with_filter_core(
-    *,
-    filter: str,
-    base_output_dir: Path,
-    as_format: Optional[List[str]] = None,
-    n_results: int = 10,
-    providers: Optional[List[str]] = None,
-    http_timeout: float = 25.0,
-    max_returned_structs: int = 30,
-) -> Dict[str, Any]:
+# =========================
+# Async OPTIMADE HTTP client
+# =========================
+
+OPTIMADE_API_VERSION = "v1"
+
+# Result attributes the OPTIMADE retriever reads, per SearchResult field, in
+# lookup order (provider-prefixed names are fallbacks for that provider).
+RESULT_ATTRIBUTES: Dict[str, Tuple[str, ...]] = {
+    "formula": ("chemical_formula_reduced", "chemical_formula"),
+    "elements": ("elements",),
+    "space_group": ("space_group_symbol", "spacegroup_symbol"),
+    "n_atoms": ("nsites",),
+    "band_gap": ("band_gap", "_oqmd_band_gap", "_gnome_bandgap"),
+    "formation_energy": ("formation_energy_per_atom", "_oqmd_formation_energy_per_atom"),
+}
+# Attributes `_cif_job` reads to render a CIF
+CIF_ATTRIBUTES = ("lattice_vectors", "cartesian_site_positions", "species_at_sites", "species")
+
+# Everything read downstream. With OPTIMADE_RESPONSE_FIELDS=1, CIF-only fetches ask
+# providers for just these via `response_fields` (JSON output keeps full entries).
+# Off by default: not every provider accepts unknown non-prefixed field names.
+RESPONSE_FIELDS = tuple(dict.fromkeys(
+    (*CIF_ATTRIBUTES, *(name for names in RESULT_ATTRIBUTES.values() for name in names))
+))
+RESTRICT_RESPONSE_FIELDS = os.getenv("OPTIMADE_RESPONSE_FIELDS", "0").strip().lower() in ("1", "true", "yes")
+
+
+def result_attribute(attrs: dict, field: str, default: Any = None) -> Any:
+    """First non-null value among the RESULT_ATTRIBUTES names for `field`."""
+    for name in RESULT_ATTRIBUTES[field]:
+        value = attrs.get(name)
+        if value is not None:
+            return value
+    return default
+
+_PREFIXED_FIELD_RE = re.compile(r"\b_[a-z0-9]+_\w+")
+
+
+def _response_fields(clause: str) -> str:
+    """`response_fields` value: RESPONSE_FIELDS plus provider-specific fields used in `clause`."""
+    return ",".join(dict.fromkeys((*RESPONSE_FIELDS, *_PREFIXED_FIELD_RE.findall(clause))))
+
+
+def _new_async_client(http_timeout: float):
     """
-    Core implementation for fetching structures with a raw OPTIMADE filter using OptimadeClient.
-    Returns a dict compatible with MCP tool output.
+    Create an httpx.AsyncClient for OPTIMADE fan-out (HTTP/2 when `h2` is installed).
+    """
+    import httpx
+
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=http_timeout,
+        follow_redirects=True,
+        headers={"Accept": "application/vnd.api+json, application/json"},
+        # Headroom for the full provider fan-out of several concurrent searches
+        limits=httpx.Limits(max_connections=256, max_keepalive_connections=64),
+    )
+
+
+# Persistent event loop (daemon thread) that owns the shared AsyncClient, so TCP/TLS
+# connections survive across tool calls; callers in worker threads submit to it.
+_bg_loop = None
+_bg_lock = threading.Lock()
+_shared_client = None
+
+
+def _get_background_loop():
+    """Start (once) and return the background event loop used for OPTIMADE I/O."""
+    import asyncio
+
+    global _bg_loop
+    if _bg_loop is None:
+        with _bg_lock:
+            if _bg_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="optimade-io-loop", daemon=True
+                ).start()
+                _bg_loop = loop
+                atexit.register(_shutdown_background_loop)
+    return _bg_loop
+
+
+def _shutdown_background_loop() -> None:
+    """Close the shared AsyncClient (sending TLS close_notify) and stop the loop at exit."""
+    import asyncio
+
+    global _shared_client
+    loop = _bg_loop
+    if loop is None or not loop.is_running():
+        return
+    client, _shared_client = _shared_client, None
+    if client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        except Exception as e:
+            logging.debug(f"[optimade] closing shared client failed: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def run_on_background_loop(coro, timeout: Optional[float] = None):
+    """
+    Run `coro` on the background loop from synchronous code and return its result.
+
+    Raises asyncio.TimeoutError if it does not finish within `timeout` seconds
+    (the coroutine is cancelled on the loop).
+    """
+    import asyncio
+
+    if timeout is not None:
+        coro = asyncio.wait_for(coro, timeout=timeout)
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+@asynccontextmanager
+async def _client_scope(http_timeout: float):
+    """
+    Yield an AsyncClient for the running loop: the pooled shared client on the
+    background loop, otherwise a per-call client closed on exit.
     """
     import asyncio
-    import hashlib
-    from datetime import datetime
 
+    global _shared_client
+    if asyncio.get_running_loop() is _bg_loop:
+        # Only touched from the background loop thread, so no lock needed
+        if _shared_client is None:
+            _shared_client = _new_async_client(http_timeout)
+        yield _shared_client
+    else:
+        async with _new_async_client(http_timeout) as client:
+            yield client
+
+
+def _next_href(nxt: Any) -> Optional[str]:
+    """Return the URL of an OPTIMADE `links.next` value (string or {"href": ...})."""
+    if isinstance(nxt, dict):
+        nxt = nxt.get("href")
+    return nxt or None
+
+
+async def _read_page(resp, remaining: int) -> Tuple[List[dict], Optional[str]]:
+    """
+    Parse one OPTIMADE page into (data entries, next URL).
+
+    With ijson the body is parsed incrementally as it arrives and reading stops
+    once `remaining` entries are collected, so oversized pages (providers that
+    ignore `page_limit`) are neither fully downloaded nor held in memory twice.
+    """
+    if ijson is None:
+        body = _json_loads(await resp.aread())
+        return body.get("data") or [], _next_href((body.get("links") or {}).get("next"))
+
+    entries = ijson.sendable_list()
+    links = ijson.sendable_list()
+    parsers = (
+        ijson.items_coro(entries, "data.item", use_float=True),
+        ijson.items_coro(links, "links.next", use_float=True),
+    )
+    data: List[dict] = []
+    async for chunk in resp.aiter_bytes():
+        for parser in parsers:
+            parser.send(chunk)
+        data.extend(entries)
+        del entries[:]
+        if len(data) >= remaining:
+            # Enough entries: the next link is not needed and the rest of the body is dropped
+            return data, None
+    for parser in parsers:
+        parser.close()
+    data.extend(entries)
+    return data, _next_href(links[0] if links else None)
+
+
+# Politeness limits: concurrent requests per provider host (across all searches on a
+# loop) and retries with backoff for rate-limit / overload responses.
+OPTIMADE_MAX_PER_HOST = int(os.getenv("OPTIMADE_MAX_PER_HOST", "4"))
+# Overall cap on in-flight page requests per loop, kept below the client's connection pool
+OPTIMADE_MAX_IN_FLIGHT = int(os.getenv("OPTIMADE_MAX_IN_FLIGHT", "64"))
+OPTIMADE_MAX_RETRIES = int(os.getenv("OPTIMADE_MAX_RETRIES", "2"))
+_RETRY_STATUS = frozenset({429, 502, 503, 504})
+_RETRY_MAX_DELAY = 10.0
+
+# Semaphores are bound to the loop they are used on: keep one set per running loop
+_host_semaphores: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def _request_semaphores(url: str):
+    """Return (overall, per-host) request semaphores for `url` on the running loop."""
+    import asyncio
+
+    per_loop = _host_semaphores.setdefault(asyncio.get_running_loop(), {})
+    overall = per_loop.get(None)
+    if overall is None:
+        overall = per_loop[None] = asyncio.Semaphore(max(1, OPTIMADE_MAX_IN_FLIGHT))
+    host = urlparse(url).netloc
+    sem = per_loop.get(host)
+    if sem is None:
+        sem = per_loop[host] = asyncio.Semaphore(max(1, OPTIMADE_MAX_PER_HOST))
+    return overall, sem
+
+
+def _retry_delay(resp, attempt: int) -> float:
+    """Seconds to wait before retrying: numeric Retry-After if given, else exponential backoff."""
+    try:
+        delay = float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        delay = 0.5 * (2 ** attempt)
+    return min(max(delay, 0.0), _RETRY_MAX_DELAY)
+
+
+async def _get_page(client, url: str, params: Optional[dict], extra: dict, remaining: int):
+    """
+    Fetch and parse one page under the per-host and overall semaphores, retrying
+    429/5xx-overload responses, failed connection attempts and timeouts; the
+    semaphores are released while backing off.
+
+    The per-host slot is taken first, so requests queued behind a slow host do
+    not hold overall slots that other hosts could use.
+    """
+    import asyncio
+
+    import httpx
+
+    overall, sem = _request_semaphores(url)
+    for attempt in range(OPTIMADE_MAX_RETRIES + 1):
+        last = attempt == OPTIMADE_MAX_RETRIES
+        async with sem, overall:
+            try:
+                async with client.stream("GET", url, params=params, **extra) as resp:
+                    if resp.status_code not in _RETRY_STATUS or last:
+                        resp.raise_for_status()
+                        return await _read_page(resp, remaining)
+                    delay = _retry_delay(resp, attempt)
+                    reason = str(resp.status_code)
+            except (httpx.ConnectError, httpx.TimeoutException) as e:
+                # Page requests are idempotent GETs, so retrying is always safe
+                if last:
+                    raise
+                delay = min(0.5 * (2 ** attempt), _RETRY_MAX_DELAY)
+                reason = type(e).__name__
+        logging.info("[optimade] %s failed (%s); retrying in %.1fs", url, reason, delay)
+        await asyncio.sleep(delay)
+
+
+async def _optimade_get(
+    client,
+    base_url: str,
+    filt: str,
+    n_results: int,
+    http_timeout: Optional[float] = None,
+    response_fields: Optional[str] = None,
+) -> dict:
+    """
+    Query one OPTIMADE base URL and return `{"data": [...]}` with up to `n_results`
+    entries, following `links.next` while fewer have been collected.
+    Errors are returned as `{"data": [], "errors": [...]}` (same shape as OptimadeClient).
+    """
+    url = f"{base_url.rstrip('/')}/{OPTIMADE_API_VERSION}/structures"
+    params: Optional[dict] = {"filter": filt, "page_limit": n_results}
+    if response_fields:
+        params["response_fields"] = response_fields
+    # Per-request timeout: the shared client may have been built with another default
+    extra = {"timeout": http_timeout} if http_timeout is not None else {}
+    data: List[dict] = []
+    try:
+        while url and len(data) < n_results:
+            page, next_url = await _get_page(client, url, params, extra, n_results - len(data))
+            data.extend(page)
+            # next links already carry the query string
+            url, params = next_url, None
+    except Exception as e:
+        logging.warning(f"[optimade] {base_url} failed: {e}")
+        return {"data": data[:n_results], "errors": [str(e)]}
+    return {"data": data[:n_results]}
+
+
+# Result cache for per-URL OPTIMADE payloads, keyed by (base_url, filter, n_results, response_fields):
+#   tier 1: in-process core.cache.TTLCache (MR_DICE_QUERY_CACHE_SIZE / MR_DICE_QUERY_CACHE_TTL)
+#   tier 2: optional JSON files under OPTIMADE_CACHE_DIR, expired by mtime (OPTIMADE_CACHE_DISK_TTL)
+_CACHE_DIR = os.getenv("OPTIMADE_CACHE_DIR") or None
+_CACHE_DISK_TTL = float(os.getenv("OPTIMADE_CACHE_DISK_TTL", "86400"))
+
+
+@lru_cache(maxsize=1)
+def _get_payload_cache():
+    """
+    The in-process result cache, created on first use.
+
+    Imported lazily so CIF process-pool workers, which import this module,
+    do not load the server package.
+    """
+    from mrdice_server.core.cache import TTLCache
+    from mrdice_server.core.config import get_query_cache_config
+
+    return TTLCache(*get_query_cache_config())
+
+
+def _cache_file(key: Tuple[str, str, int, str]) -> Optional[Path]:
+    if not _CACHE_DIR:
+        return None
+    digest = hashlib.blake2b("\x00".join(map(str, key)).encode("utf-8"), digest_size=16).hexdigest()
+    return Path(_CACHE_DIR) / f"{digest}.json"
+
+
+def _read_cache_file(path: Path) -> Optional[dict]:
+    """Load a disk-cache entry, or None if it is missing, expired or unreadable."""
+    try:
+        if time.time() - path.stat().st_mtime > _CACHE_DISK_TTL:
+            return None
+        return _json_loads(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache_file(path: Path, payload: dict) -> None:
+    """Write a disk-cache entry via a per-writer temp file, so readers never see partial JSON."""
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(_dumps_json(payload, indent=False))
+        tmp.replace(path)
+    except OSError as e:
+        logging.debug(f"[optimade] cache write failed for {path}: {e}")
+        tmp.unlink(missing_ok=True)
+
+
+async def _cache_get(key: Tuple[str, str, int, str]) -> Optional[dict]:
+    """
+    Return a cached payload (memory, then disk) or None.
+
+    Disk reads run on a worker thread: this is awaited on the shared
+    background loop.
+    """
+    payload = _get_payload_cache().get(key)
+    if payload is not None:
+        return payload
+
+    path = _cache_file(key)
+    if path is None:
+        return None
     from anyio import to_thread
-    from optimade.client import OptimadeClient
 
-    filt = (filter or "").strip()
-    if not filt:
-        raise ValueError("Empty filter string")
-    filt = normalize_cfr_in_filter(filt)
+    payload = await to_thread.run_sync(_read_cache_file, path)
+    if payload is not None:
+        _cache_put(key, payload, to_disk=False)
+    return payload
+
+
+def _cache_put(key: Tuple[str, str, int, str], payload: dict, to_disk: bool = True) -> None:
+    """
+    Store a successful payload (responses with errors are never cached).
+
+    The disk copy is written on the writer pool, so this never blocks the loop.
+    """
+    if payload.get("errors"):
+        return
+    _get_payload_cache().set(key, payload)
+
+    path = _cache_file(key) if to_disk else None
+    if path is not None:
+        _get_write_pool().submit(_write_cache_file, path, payload)
+
+
+# In-flight requests on the background loop, keyed like the result cache
+_inflight: Dict[Tuple[str, str, int, str], Any] = {}
 
-    used = set(providers) if providers and len(providers) > 0 else DEFAULT_PROVIDERS
-    provider_to_urls = _provider_urls_from_names(used)
 
-    _per_provider_timeout = max(http_timeout + 15, 30)
+async def _optimade_get_coalesced(
+    client,
+    base_url: str,
+    filt: str,
+    n_results: int,
+    http_timeout: Optional[float] = None,
+    bypass_cache: bool = False,
+    response_fields: Optional[str] = None,
+) -> dict:
+    """
+    `_optimade_get` behind the result cache; on a miss, concurrent identical
+    requests (same URL, filter and size) share one HTTP round trip.
+
+    Coalescing only happens on the background loop, where every search runs
+    (futures are loop-bound).
+    """
+    import asyncio
+
+    key = (base_url, filt, n_results, response_fields or "")
+    if not bypass_cache:
+        cached = await _cache_get(key)
+        if cached is not None:
+            return {**cached, "data": list(cached.get("data") or [])}
+
+    if asyncio.get_running_loop() is not _bg_loop:
+        result = await _optimade_get(client, base_url, filt, n_results, http_timeout, response_fields)
+        _cache_put(key, result)
+        # The cache now holds `result`: hand out a copy like a cache hit does
+        return {**result, "data": list(result.get("data") or [])}
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            _optimade_get(client, base_url, filt, n_results, http_timeout, response_fields)
+        )
+        _inflight[key] = task
+
+        def _done(t) -> None:
+            _inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                _cache_put(key, t.result())
+
+        task.add_done_callback(_done)
+    # shield: one caller timing out must not cancel the request for the others
+    result = await asyncio.shield(task)
+    # Callers mutate nothing but the list is shared: hand out a shallow copy
+    return {**result, "data": list(result.get("data") or [])}
+
+
+async def _query_provider_urls(
+    client,
+    provider_urls: Sequence[str],
+    filt: str,
+    n_results: int,
+    http_timeout: Optional[float] = None,
+    bypass_cache: bool = False,
+    response_fields: Optional[str] = None,
+) -> dict:
+    """
+    Query all base URLs of one provider concurrently.
+
+    Returns the OptimadeClient.get() shape: `{"structures": {filt: {url: {"data": [...]}}}}`.
+    """
+    import asyncio
+
+    payloads = await asyncio.gather(
+        *[
+            _optimade_get_coalesced(client, u, filt, n_results, http_timeout, bypass_cache, response_fields)
+            for u in provider_urls
+        ]
+    )
+    return {"structures": {filt: dict(zip(provider_urls, payloads))}}
 
-    async def _query_one(provider: str) -> dict:
-        provider_urls = provider_to_urls.get(provider, [])
+
+async def _fanout(
+    filters: Dict[str, str],
+    n_results: int,
+    http_timeout: float,
+    bypass_cache: bool = False,
+    log_tag: str = "optimade",
+    restrict_fields: bool = False,
+) -> Tuple[List[dict], Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]:
+    """
+    Query every provider with its filter clause concurrently; with `restrict_fields`,
+    only the attributes in `_response_fields(clause)` are requested.
+
+    Returns (norm_results, stats, plan) as produced by `normalize_and_collect`
+    and `distribute_quota_fair`.
+    """
+    import asyncio
+
+    # Query each (base URL, clause) once even if several providers list the same
+    # endpoint; results are keyed by URL downstream, so nothing needs remapping.
+    provider_to_urls: Dict[str, List[str]] = {}
+    claimed: set = set()
+    for provider, urls in _provider_urls_from_names(filters.keys()).items():
+        clause = filters[provider]
+        unique = []
+        for u in urls:
+            key = (u.rstrip("/"), clause)
+            if key in claimed:
+                logging.debug("[%s] %s already queried for another provider; skipping for %s", log_tag, u, provider)
+                continue
+            claimed.add(key)
+            unique.append(u)
+        provider_to_urls[provider] = unique
+    per_provider_timeout = max(http_timeout + 15, 30)
+
+    async def _query_one(client, provider: str, clause: str) -> dict:
+        provider_urls = provider_to_urls.get(provider)
+        if provider_urls is None:
+            logging.warning(f"[{log_tag}] No URLs found for provider {provider}")
+            return {"structures": {}}
         if not provider_urls:
-            logging.warning(f"[raw] No URLs found for provider {provider}")
             return {"structures": {}}
 
-        client = OptimadeClient(
-            base_urls=provider_urls,
-            max_results_per_provider=n_results,
-            http_timeout=http_timeout,
-        )
         try:
             return await asyncio.wait_for(
-                to_thread.run_sync(lambda: client.get(filter=filt)),
-                timeout=_per_provider_timeout,
+                _query_provider_urls(
+                    client, provider_urls, clause, n_results, http_timeout, bypass_cache,
+                    _response_fields(clause) if restrict_fields else None,
+                ),
+                timeout=per_provider_timeout,
             )
         except asyncio.TimeoutError:
-            logging.warning(f"[raw] Provider {provider} timed out after {_per_provider_timeout}s")
+            logging.warning(f"[{log_tag}] Provider {provider} timed out after {per_provider_timeout}s")
             return {"structures": {}}
 
-    results_list = await asyncio.gather(
-        *[_query_one(p) for p in used],
-        return_exceptions=True,
-    )
+    async with _client_scope(http_timeout) as client:
+        results_list = await asyncio.gather(
+            *[_query_one(client, p, clause) for p, clause in filters.items()],
+            return_exceptions=True,
+        )
 
     norm_results, stats = normalize_and_collect(results_list)
-    plan = distribute_quota_fair(stats, n_results)
+    return norm_results, stats, distribute_quota_fair(stats, n_results)
 
-    base_output_dir.mkdir(parents=True, exist_ok=True)
-    tag = filter_to_tag(filt)
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    short = hashlib.sha1(filt.encode("utf-8")).hexdigest()[:8]
-    out_folder = base_output_dir / f"{tag}_{ts}_{short}"
 
-    formats_to_save = as_format or ["cif", "json"]
+async def _save_all(
+    norm_results: List[dict],
+    out_folder: Path,
+    formats_to_save: List[str],
+    plan: Dict[str, Dict[str, int]],
+) -> Tuple[List[str], List[str], List[str], List[dict]]:
+    """
+    Save every provider result in every format concurrently.
+
+    Returns (files, warnings, providers_seen, cleaned_structures); cleaned copies
+    come from the first format only.
+    """
+    import asyncio
+
+    from anyio import to_thread
 
     all_files: List[str] = []
     all_warnings: List[str] = []
     all_providers: List[str] = []
     all_cleaned: List[dict] = []
 
-    for res in norm_results:
-        for fmt in formats_to_save:
-            files, warns, providers_seen, cleaned = await to_thread.run_sync(
-                save_structures,
-                res,
-                out_folder,
-                (fmt == "cif"),
-                plan,
-            )
-            all_files.extend(files)
-            all_warnings.extend(warns)
-            all_providers.extend(providers_seen)
-            if fmt == formats_to_save[0]:
-                all_cleaned.extend(cleaned)
-
-    all_providers = list(dict.fromkeys(all_providers))
+    # Nothing to write (no results, or every provider failed): don't create the folder
+    if not any(q > 0 for per_url in plan.values() for q in per_url.values()):
+        return all_files, all_warnings, all_providers, all_cleaned
 
-    manifest = {
-        "mode": "raw_filter",
-        "filter": filt,
-        "providers_requested": sorted(list(used)),
-        "providers_seen": all_providers,
-        "files": all_files,
-        "warnings": all_warnings,
-        "format": formats_to_save,
-        "n_results": n_results,
-        "stats": stats,
-        "plan": plan,
-        "n_found": len(all_cleaned),
-    }
+    # Created once here rather than by every save_structures call
     out_folder.mkdir(parents=True, exist_ok=True)
-    (out_folder / "summary.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+
+    # Each (provider result, format) pair writes distinct files: save them concurrently.
+    jobs = [(res, fmt) for res in norm_results for fmt in formats_to_save]
+    limiter = _get_save_limiter()
+    saved = await asyncio.gather(*[
+        to_thread.run_sync(save_structures, res, out_folder, (fmt == "cif"), plan, True, limiter=limiter)
+        for res, fmt in jobs
+    ])
+    for (_res, fmt), (files, warns, providers_seen, cleaned) in zip(jobs, saved):
+        all_files.extend(files)
+        all_warnings.extend(warns)
+        all_providers.extend(providers_seen)
+        if fmt == formats_to_save[0]:
+            all_cleaned.extend(cleaned)
+
+    return all_files, all_warnings, list(dict.fromkeys(all_providers)), all_cleaned
+
+
+async def _finalize_fetch(
+    out_folder: Path,
+    manifest: Dict[str, Any],
+    saved: Tuple[List[str], List[str], List[str], List[dict]],
+    max_returned_structs: int,
+) -> Dict[str, Any]:
+    """
+    Write summary.json (on a worker thread, off the shared I/O loop) and build the
+    MCP tool output from the save results.
+    """
+    from anyio import to_thread
+
+    all_files, all_warnings, all_providers, all_cleaned = saved
+    if all_files:
+        manifest["n_found"] = len(all_cleaned)
+        # out_folder was created by _save_all
+        await to_thread.run_sync((out_folder / "summary.json").write_bytes, _dumps_json(manifest))
+    else:
+        logging.debug(f"[optimade] no structures saved; skipping summary for {out_folder}")
 
     all_cleaned = all_cleaned[:max_returned_structs]
     n_found = len(all_cleaned)
@@ -783,6 +1489,53 @@ async def fetch_structures_with_filter_core(
     }
 
 
+async def fetch_structures_with_filter_core(
+    *,
+    filter: str,
+    base_output_dir: Path,
+    as_format: Optional[List[str]] = None,
+    n_results: int = 10,
+    providers: Optional[List[str]] = None,
+    http_timeout: float = 25.0,
+    max_returned_structs: int = 30,
+    bypass_cache: bool = False,
+) -> Dict[str, Any]:
+    """
+    Core implementation for fetching structures with a raw OPTIMADE filter (async httpx fan-out).
+    Returns a dict compatible with MCP tool output.
+    """
+    filt = (filter or "").strip()
+    if not filt:
+        raise ValueError("Empty filter string")
+    filt = normalize_cfr_in_filter(filt)
+
+    used = frozenset(providers) if providers else DEFAULT_PROVIDERS
+    formats_to_save = as_format or ["cif", "json"]
+    norm_results, stats, plan = await _fanout(
+        {p: filt for p in used}, n_results, http_timeout, bypass_cache, log_tag="raw",
+        restrict_fields=RESTRICT_RESPONSE_FIELDS and "json" not in formats_to_save,
+    )
+
+    out_folder = _make_out_folder(base_output_dir, filt, filt)
+
+    saved = await _save_all(norm_results, out_folder, formats_to_save, plan)
+    files, warnings, providers_seen, _cleaned = saved
+
+    manifest = {
+        "mode": "raw_filter",
+        "filter": filt,
+        "providers_requested": _sorted_providers(used),
+        "providers_seen": providers_seen,
+        "files": files,
+        "warnings": warnings,
+        "format": formats_to_save,
+        "n_results": n_results,
+        "stats": stats,
+        "plan": plan,
+    }
+    return await _finalize_fetch(out_folder, manifest, saved, max_returned_structs)
+
+
 async def fetch_structures_with_spg_core(
     *,
     base_filter: Optional[str],
@@ -793,23 +1546,16 @@ async def fetch_structures_with_spg_core(
     providers: Optional[List[str]] = None,
     http_timeout: float = 25.0,
     max_returned_structs: int = 30,
+    bypass_cache: bool = False,
 ) -> Dict[str, Any]:
     """
-    Core implementation for fetching structures constrained by space group using OptimadeClient.
+    Core implementation for fetching structures constrained by space group (async httpx fan-out).
     """
-    import asyncio
-    import hashlib
-    from datetime import datetime
-
-    from anyio import to_thread
-    from optimade.client import OptimadeClient
-
     base = (base_filter or "").strip()
     base = normalize_cfr_in_filter(base)
-    used = set(providers) if providers and len(providers) > 0 else DEFAULT_SPG_PROVIDERS
+    used = frozenset(providers) if providers else DEFAULT_SPG_PROVIDERS
 
-    spg_map = get_spg_filter_map(spg_number, used)
-    filters = build_provider_filters(base, spg_map)
+    filters = dict(_spg_provider_filters(base, spg_number, used))
     if not filters:
         return {
             "output_dir": Path(),
@@ -819,97 +1565,32 @@ async def fetch_structures_with_spg_core(
             "message": "No provider-specific space-group clause available for the specified providers.",
         }
 
-    provider_to_urls = _provider_urls_from_names(filters.keys())
-    _per_provider_timeout = max(http_timeout + 15, 30)
-
-    async def _query_one(provider: str, clause: str) -> dict:
-        provider_urls = provider_to_urls.get(provider, [])
-        if not provider_urls:
-            logging.warning(f"[spg] No URLs found for provider {provider}")
-            return {"structures": {}}
-
-        client = OptimadeClient(
-            base_urls=provider_urls,
-            max_results_per_provider=n_results,
-            http_timeout=http_timeout,
-        )
-        try:
-            return await asyncio.wait_for(
-                to_thread.run_sync(lambda: client.get(filter=clause)),
-                timeout=_per_provider_timeout,
-            )
-        except asyncio.TimeoutError:
-            logging.warning(f"[spg] Provider {provider} timed out after {_per_provider_timeout}s")
-            return {"structures": {}}
-
-    results_list = await asyncio.gather(
-        *[_query_one(p, clause) for p, clause in filters.items()],
-        return_exceptions=True,
-    )
-
-    norm_results, stats = normalize_and_collect(results_list)
-    plan = distribute_quota_fair(stats, n_results)
-
-    base_output_dir.mkdir(parents=True, exist_ok=True)
-    tag = filter_to_tag(f"{base} AND spg={spg_number}")
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    short = hashlib.sha1(f"{base}|spg={spg_number}".encode("utf-8")).hexdigest()[:8]
-    out_folder = base_output_dir / f"{tag}_{ts}_{short}"
-
     formats_to_save = as_format or ["cif", "json"]
+    norm_results, stats, plan = await _fanout(
+        filters, n_results, http_timeout, bypass_cache, log_tag="spg",
+        restrict_fields=RESTRICT_RESPONSE_FIELDS and "json" not in formats_to_save,
+    )
 
-    all_files: List[str] = []
-    all_warnings: List[str] = []
-    all_providers: List[str] = []
-    all_cleaned: List[dict] = []
-
-    for res in norm_results:
-        for fmt in formats_to_save:
-            files, warns, providers_seen, cleaned = await to_thread.run_sync(
-                save_structures,
-                res,
-                out_folder,
-                (fmt == "cif"),
-                plan,
-            )
-            all_files.extend(files)
-            all_warnings.extend(warns)
-            all_providers.extend(providers_seen)
-            if fmt == formats_to_save[0]:
-                all_cleaned.extend(cleaned)
+    out_folder = _make_out_folder(base_output_dir, f"{base} AND spg={spg_number}", f"{base}|spg={spg_number}")
 
-    all_providers = list(dict.fromkeys(all_providers))
+    saved = await _save_all(norm_results, out_folder, formats_to_save, plan)
+    files, warnings, providers_seen, _cleaned = saved
 
     manifest = {
         "mode": "space_group",
         "base_filter": base,
         "spg_number": spg_number,
-        "providers_requested": sorted(list(used)),
-        "providers_seen": all_providers,
-        "files": all_files,
-        "warnings": all_warnings,
+        "providers_requested": _sorted_providers(used),
+        "providers_seen": providers_seen,
+        "files": files,
+        "warnings": warnings,
         "format": formats_to_save,
         "n_results": n_results,
         "stats": stats,
         "plan": plan,
         "per_provider_filters": filters,
-        "n_found": len(all_cleaned),
-    }
-    out_folder.mkdir(parents=True, exist_ok=True)
-    (out_folder / "summary.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
-
-    all_cleaned = all_cleaned[:max_returned_structs]
-    n_found = len(all_cleaned)
-    return {
-        "output_dir": out_folder,
-        "cleaned_structures": all_cleaned,
-        "n_found": n_found,
-        "files": all_files,
-        "warnings": all_warnings,
-        "providers_seen": all_providers,
-        "code": -9999 if n_found == 0 else 0,
-        "message": "Success",
     }
+    return await _finalize_fetch(out_folder, manifest, saved, max_returned_structs)
 
 
 async def fetch_structures_with_bandgap_core(
@@ -923,23 +1604,16 @@ async def fetch_structures_with_bandgap_core(
     providers: Optional[List[str]] = None,
     http_timeout: float = 25.0,
     max_returned_structs: int = 30,
+    bypass_cache: bool = False,
 ) -> Dict[str, Any]:
     """
-    Core implementation for fetching structures constrained by band gap using OptimadeClient.
+    Core implementation for fetching structures constrained by band gap (async httpx fan-out).
     """
-    import asyncio
-    import hashlib
-    from datetime import datetime
-
-    from anyio import to_thread
-    from optimade.client import OptimadeClient
-
     base = (base_filter or "").strip()
     base = normalize_cfr_in_filter(base)
-    used = set(providers) if providers and len(providers) > 0 else DEFAULT_BG_PROVIDERS
+    used = frozenset(providers) if providers else DEFAULT_BG_PROVIDERS
 
-    bg_map = get_bandgap_filter_map(min_bg, max_bg, used)
-    filters = build_provider_filters(base, bg_map)
+    filters = dict(_bandgap_provider_filters(base, min_bg, max_bg, used))
     if not filters:
         return {
             "output_dir": Path(),
@@ -949,125 +1623,30 @@ async def fetch_structures_with_bandgap_core(
             "message": "No provider-specific band-gap clause available for the specified providers.",
         }
 
-    provider_to_urls = _provider_urls_from_names(filters.keys())
-    _per_provider_timeout = max(http_timeout + 15, 30)
-
-    async def _query_one(provider: str, clause: str) -> dict:
-        provider_urls = provider_to_urls.get(provider, [])
-        if not provider_urls:
-            logging.warning(f"[bandgap] No URLs found for provider {provider}")
-            return {"structures": {}}
-
-        client = OptimadeClient(
-            base_urls=provider_urls,
-            max_results_per_provider=n_results,
-            http_timeout=http_timeout,
-        )
-        try:
-            return await asyncio.wait_for(
-                to_thread.run_sync(lambda: client.get(filter=clause)),
-                timeout=_per_provider_timeout,
-            )
-        except asyncio.TimeoutError:
-            logging.warning(f"[bandgap] Provider {provider} timed out after {_per_provider_timeout}s")
-            return {"structures": {}}
-
-    results_list = await asyncio.gather(
-        *[_query_one(p, clause) for p, clause in filters.items()],
-        return_exceptions=True,
-    )
-
-    norm_results, stats = normalize_and_collect(results_list)
-    plan = distribute_quota_fair(stats, n_results)
-
-    base_output_dir.mkdir(parents=True, exist_ok=True)
-    tag = filter_to_tag(f"{base} AND bandgap[{min_bg},{max_bg}]")
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    short = hashlib.sha1(f"{base}|bg={min_bg}:{max_bg}".encode("utf-8")).hexdigest()[:8]
-    out_folder = base_output_dir / f"{tag}_{ts}_{short}"
-
     formats_to_save = as_format or ["cif", "json"]
+    norm_results, stats, plan = await _fanout(
+        filters, n_results, http_timeout, bypass_cache, log_tag="bandgap",
+        restrict_fields=RESTRICT_RESPONSE_FIELDS and "json" not in formats_to_save,
+    )
 
-    all_files: List[str] = []
-    all_warnings: List[str] = []
-    all_providers: List[str] = []
-    all_cleaned: List[dict] = []
-
-    for res in norm_results:
-        for fmt in formats_to_save:
-            files, warns, providers_seen, cleaned = await to_thread.run_sync(
-                save_structures,
-                res,
-                out_folder,
-                (fmt == "cif"),
-                plan,
-            )
-            all_files.extend(files)
-            all_warnings.extend(warns)
-            all_providers.extend(providers_seen)
-            if fmt == formats_to_save[0]:
-                all_cleaned.extend(cleaned)
+    out_folder = _make_out_folder(base_output_dir, f"{base} AND bandgap[{min_bg},{max_bg}]", f"{base}|bg={min_bg}:{max_bg}")
 
-    all_providers = list(dict.fromkeys(all_providers))
+    saved = await _save_all(norm_results, out_folder, formats_to_save, plan)
+    files, warnings, providers_seen, _cleaned = saved
 
     manifest = {
         "mode": "band_gap",
         "base_filter": base,
         "band_gap_min": min_bg,
         "band_gap_max": max_bg,
-        "providers_requested": sorted(list(used)),
-        "providers_seen": all_providers,
-        "files": all_files,
-        "warnings": all_warnings,
+        "providers_requested": _sorted_providers(used),
+        "providers_seen": providers_seen,
+        "files": files,
+        "warnings": warnings,
         "format": formats_to_save,
         "n_results": n_results,
         "stats": stats,
         "plan": plan,
         "per_provider_filters": filters,
-        "n_found": len(all_cleaned),
-    }
-    out_folder.mkdir(parents=True, exist_ok=True)
-    (out_folder / "summary.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
-
-    all_cleaned = all_cleaned[:max_returned_structs]
-    n_found = len(all_cleaned)
-    return {
-        "output_dir": out_folder,
-        "cleaned_structures": all_cleaned,
-        "n_found": n_found,
-        "files": all_files,
-        "warnings": all_warnings,
-        "providers_seen": all_providers,
-        "code": -9999 if n_found == 0 else 0,
-        "message": "Success",
     }
-
-
-if __name__ == "__main__":
-    urls = get_base_urls()
-    print(urls)
-    print(len(urls))
-
-
-
-    # # 0 occurrence
-    # f0 = 'elements HAS ANY "Si","O"'
-    # print(normalize_cfr_in_filter(f0))
-    # # -> elements HAS ANY "Si","O"
-
-    # # 1 occurrence
-    # f1 = 'chemical_formula_reduced="SiO2"'
-    # print(normalize_cfr_in_filter(f1))
-    # # -> chemical_formula_reduced="O2Si"
-
-    # # 2 occurrences
-    # f2 = '(chemical_formula_reduced="SiO2" OR chemical_formula_reduced="Al2O3")'
-    # print(normalize_cfr_in_filter(f2))
-    # # -> (chemical_formula_reduced="O2Si" OR chemical_formula_reduced="Al2O3")
-
-    # # 4 occurrences
-    # f4 = ('(chemical_formula_reduced="SiO2" OR chemical_formula_reduced="Al2O3") '
-    #     'AND (chemical_formula_reduced="MgO" OR chemical_formula_reduced="NaCl")')
-    # print(normalize_cfr_in_filter(f4))
-    # # -> (chemical_formula_reduced="O2Si" OR chemical_formula_reduced="Al2O3") 
-    # #    AND (chemical_formula_reduced="MgO" OR chemical_formula_reduced="ClNa")
\ No newline at end of file
+    return await _finalize_fetch(out_folder, manifest, saved, max_returned_structs)
@@ -1,8 +1,7 @@
 import json
 import logging
-import hashlib
 import sys
-from datetime import datetime
+import time
 from pathlib import Path
 from typing import Any, Dict, List
 
@@ -10,6 +9,7 @@ import requests
 
 from .base import BaseRetriever
 from ..core.config import get_bohrium_output_dir
+from ..core.utils import short_hash
 from ..models.schema import SearchResult
 
 
@@ -122,9 +122,8 @@ class BohriumPublicRetriever(BaseRetriever):
             return []
 
         filter_str = f"{formula or ''}|n_results={n_results}|filters={json.dumps(payload_filters, sort_keys=True)}"
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        short_hash = hashlib.sha1(filter_str.encode("utf-8")).hexdigest()[:8]
-        output_dir = self.base_output_dir / f"bohrium_{ts}_{short_hash}"
+        ts = time.strftime("%Y%m%d_%H%M%S")
+        output_dir = self.base_output_dir / f"bohrium_{ts}_{short_hash(filter_str)}"
         output_dir.mkdir(parents=True, exist_ok=True)
 
         output_formats = [output_format]
@@ -1,14 +1,15 @@
-import json
 import logging
-import hashlib
+import os
 import sqlite3
 import sys
-from datetime import datetime
+import threading
+import time
 from pathlib import Path
 from typing import Any, Dict, List
 
 from .base import BaseRetriever
 from ..core.config import get_data_dir
+from ..core.utils import short_hash
 from ..models.schema import SearchResult
 
 
@@ -23,16 +24,13 @@ def _import_mofdb_utils():
             sys.path.insert(0, str(database_path))
 
         from mofdbsql_database.utils import (
-            validate_sql_security,
+            prepare_sql,
             save_mofs,
-            tag_from_filters,
-            base_data_dir,
             build_output_stem,
         )
         return {
-            "validate_sql_security": validate_sql_security,
+            "prepare_sql": prepare_sql,
             "save_mofs": save_mofs,
-            "tag_from_filters": tag_from_filters,
             "build_output_stem": build_output_stem,
         }
     except ImportError as e:
@@ -40,6 +38,79 @@ def _import_mofdb_utils():
         raise
 
 
+# Read-oriented pragmas applied once when a pooled connection is opened.
+# The database is opened read-only, so disabling the journal / sync is safe.
+_READ_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA cache_size=-524288",  # 512 MB page cache
+    "PRAGMA mmap_size=8589934592",  # 8 GB (capped by SQLite to the DB size / compile limit)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA read_uncommitted=1",
+)
+
+_conn_local = threading.local()
+
+
+def _get_connection(db_path: Path) -> sqlite3.Connection:
+    """
+    Return a pooled read-only connection to the MOFdb SQLite database.
+
+    sqlite3 connections are bound to the thread that created them, so the pool
+    keeps one connection per (worker thread, db path). Pragmas are applied once
+    on creation instead of per query, keeping the page cache warm across requests.
+    """
+    pool = getattr(_conn_local, "pool", None)
+    if pool is None:
+        pool = _conn_local.pool = {}
+
+    key = str(db_path)
+    conn = pool.get(key)
+    if conn is None:
+        # isolation_level=None: autocommit, no implicit BEGIN around pure SELECTs
+        # Default tuple rows: dicts are built once per row in save_mofs
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+        for pragma in _READ_PRAGMAS:
+            try:
+                conn.execute(pragma).fetchall()
+            except sqlite3.Error as exc:
+                logging.debug(f"MOFdb pragma skipped ({pragma}): {exc}")
+        pool[key] = conn
+    return conn
+
+
+# Output folder timestamp (kept human-readable: folder names are user-facing)
+_TS_FMT = "%Y%m%d_%H%M%S"
+
+# Paths verified once per process; the MOFdb file and output root are static
+_db_ok_paths: set = set()
+_output_roots_ready: set = set()
+
+_migrated_paths: set = set()
+_migrate_lock = threading.Lock()
+
+
+def _maybe_migrate(db_path: Path) -> None:
+    """
+    Apply MOFdb index migrations once per process when MOFDB_SQL_AUTO_MIGRATE=1.
+
+    Runtime connections are read-only, so this needs write access to the DB file;
+    otherwise run `mofdbsql_database/migrate.py` once offline.
+    """
+    if os.getenv("MOFDB_SQL_AUTO_MIGRATE") != "1" or not db_path.exists():
+        return
+    with _migrate_lock:
+        if str(db_path) in _migrated_paths:
+            return
+        _migrated_paths.add(str(db_path))
+        try:
+            from mofdbsql_database.migrate import migrate_mofdb
+
+            migrate_mofdb(db_path)
+        except Exception as exc:
+            logging.warning(f"MOFdb auto-migration failed: {exc}")
+
+
 class MofdbSqlRetriever(BaseRetriever):
     def __init__(self) -> None:
         self.data_dir = get_data_dir()
@@ -55,22 +126,19 @@ class MofdbSqlRetriever(BaseRetriever):
     def _get_db_path(self) -> Path:
         """Get MOFdb SQLite database path from environment variable."""
         if self._db_path is None:
-            import os
-
             db_path = os.getenv("MOFDB_SQL_DB_PATH")
             if not db_path:
                 raise RuntimeError("MOFDB_SQL_DB_PATH is not set in environment (.env)")
 
             self._db_path = Path(db_path)
+            _maybe_migrate(self._db_path)
         return self._db_path
 
     def fetch(self, filters: Dict[str, Any], n_results: int, output_format: str) -> List[SearchResult]:
         utils = self._get_utils()
-        validate_sql_security = utils["validate_sql_security"]
+        prepare_sql = utils["prepare_sql"]
         save_mofs = utils["save_mofs"]
-        tag_from_filters = utils["tag_from_filters"]
         build_output_stem = utils["build_output_stem"]
-        base_data_dir = utils.get("base_data_dir")
 
         # Extract SQL query from filters
         sql_query = filters.get("sql_query")
@@ -78,67 +146,58 @@ class MofdbSqlRetriever(BaseRetriever):
             # If no SQL query, construct a simple query from other filters
             sql_query = self._build_sql_from_filters(filters, n_results)
         else:
-            # Validate SQL security
-            validate_sql_security(sql_query)
-            # Add LIMIT if not present
-            if "LIMIT" not in sql_query.upper():
-                sql_query = f"{sql_query.rstrip(';')} LIMIT {n_results}"
+            # Validate SQL security and add LIMIT if not present (single pass)
+            sql_query = prepare_sql(sql_query, n_results)
 
         # Execute SQL query
         db_path = self._get_db_path()
-        if not db_path.exists():
-            logging.error(f"MOFdb SQLite database not found at {db_path}")
-            return []
+        if str(db_path) not in _db_ok_paths:
+            if not db_path.is_file():
+                logging.error(f"MOFdb SQLite database not found at {db_path}")
+                return []
+            _db_ok_paths.add(str(db_path))
 
         try:
-            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(sql_query)
+            conn = _get_connection(db_path)
+            cursor = conn.execute(sql_query)
+            columns = [d[0] for d in cursor.description]
             rows = cursor.fetchall()
-            conn.close()
-
-            # Convert rows to dicts
-            items = [dict(row) for row in rows]
         except Exception as exc:
             logging.error(f"MOFdb SQL query failed: {exc}")
             return []
 
         # Save structures
-        filter_str = sql_query
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        short_hash = hashlib.sha1(filter_str.encode("utf-8")).hexdigest()[:8]
-        output_dir = (
+        filter_str = f"{sql_query}\x00{n_results}"
+        ts = time.strftime(_TS_FMT)
+        output_root = (
             self.data_dir
             / "mrdice_server"
             / "database"
             / "mofdbsql_database"
             / "materials_data_mofdb"
-            / f"sql_query_{ts}_{short_hash}"
         )
-        output_dir.mkdir(parents=True, exist_ok=True)
+        if str(output_root) not in _output_roots_ready:
+            output_root.mkdir(parents=True, exist_ok=True)
+            _output_roots_ready.add(str(output_root))
+        # Parents exist; only the per-request folder is created here
+        output_dir = output_root / f"sql_query_{ts}_{short_hash(filter_str)}"
+        output_dir.mkdir(exist_ok=True)
 
         output_formats = [output_format] if output_format else ["cif", "json"]
         try:
-            # Temporarily set base_data_dir for save_mofs
-            import mofdbsql_database.utils as mofdb_utils
-            original_base_data_dir = mofdb_utils.base_data_dir
-            if base_data_dir:
-                mofdb_utils.base_data_dir = base_data_dir
-            
+            # fetch() already runs on a worker thread, so save inline (no extra hop)
             items, warnings = save_mofs(
-                items=items,
+                items=rows,
                 output_dir=output_dir,
                 output_formats=output_formats,
+                columns=columns,
             )
-            
-            # Restore original base_data_dir
-            mofdb_utils.base_data_dir = original_base_data_dir
             if warnings:
                 for warning in warnings:
                     logging.warning(f"MOFdb save warning: {warning}")
         except Exception as exc:
             logging.error(f"MOFdb save failed: {exc}")
+            items = [dict(zip(columns, row)) for row in rows]
 
         # Convert to SearchResult
         results: List[SearchResult] = []
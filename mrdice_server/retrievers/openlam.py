@@ -1,19 +1,24 @@
-import json
 import logging
-import hashlib
+import shutil
 import sys
-from datetime import datetime
+import uuid
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from .base import BaseRetriever
-from ..core.config import get_data_dir
+from ..core.cache import TTLCache
+from ..core.config import get_data_dir, get_query_cache_config
+from ..core.utils import short_hash
 from ..models.schema import SearchResult
 
 
+@lru_cache(maxsize=1)
 def _import_openlam_utils():
     """
     Lazy import of OpenLAM utils to avoid import errors at module level.
+
+    Cached per process: a new retriever is created for every search.
     """
     try:
         project_root = Path(__file__).parent.parent
@@ -24,23 +29,27 @@ def _import_openlam_utils():
         from openlam_database.utils import (
             normalize_formula,
             save_structures_openlam,
-            tag_from_filters,
             parse_iso8601_utc,
+            structure_basename,
         )
         return {
             "normalize_formula": normalize_formula,
             "save_structures_openlam": save_structures_openlam,
-            "tag_from_filters": tag_from_filters,
             "parse_iso8601_utc": parse_iso8601_utc,
+            "structure_basename": structure_basename,
         }
     except ImportError as e:
         logging.error(f"Failed to import OpenLAM utils: {e}")
         raise
 
 
+@lru_cache(maxsize=1)
 def _import_crystal_structure():
     """
     Lazy import of CrystalStructure class from OpenLAM.
+
+    Deferred until the first OpenLAM query so server start-up does not pay for
+    `lam_optimize` (and its scientific deps); cached per process afterwards.
     """
     try:
         project_root = Path(__file__).parent.parent
@@ -55,6 +64,31 @@ def _import_crystal_structure():
         raise
 
 
+# Query results keyed by the normalized filter tuple (shared by all retriever instances)
+_query_cache = TTLCache(*get_query_cache_config())
+
+
+def _save_atomically(save_structures_openlam, structures: List, output_dir: Path, output_formats: List[str]) -> None:
+    """
+    Save into a private temporary folder and rename it to `output_dir` once
+    every file is written, so an existing `output_dir` is always complete
+    (an interrupted run leaves only its temporary folder behind).
+    """
+    tmp_dir = output_dir.with_name(f".{output_dir.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp_dir.mkdir(parents=True)
+        save_structures_openlam(items=structures, output_dir=tmp_dir, output_formats=output_formats)
+        tmp_dir.rename(output_dir)
+    except Exception as exc:
+        if output_dir.is_dir():
+            # A concurrent identical query published the same folder first
+            logging.debug(f"OpenLAM: {output_dir} already saved by another request")
+        else:
+            logging.error(f"OpenLAM save failed: {exc}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 class OpenlamRetriever(BaseRetriever):
     def __init__(self) -> None:
         self.data_dir = get_data_dir()
@@ -77,8 +111,8 @@ class OpenlamRetriever(BaseRetriever):
         utils = self._get_utils()
         normalize_formula = utils["normalize_formula"]
         save_structures_openlam = utils["save_structures_openlam"]
-        tag_from_filters = utils["tag_from_filters"]
         parse_iso8601_utc = utils["parse_iso8601_utc"]
+        structure_basename = utils["structure_basename"]
         
         CrystalStructure = self._get_crystal_structure()
 
@@ -108,50 +142,65 @@ class OpenlamRetriever(BaseRetriever):
             except Exception as e:
                 logging.warning(f"Failed to parse max_submission_time: {e}")
 
-        # Query OpenLAM database
-        try:
-            data = CrystalStructure.query_by_offset(
-                formula=formula,
-                min_energy=min_energy,
-                max_energy=max_energy,
-                min_submission_time=min_submission_time,
-                max_submission_time=max_submission_time,
-                offset=0,
-                limit=n_results,
-            )
-            structures = data.get("items", [])
-        except Exception as exc:
-            logging.error(f"OpenLAM query failed: {exc}")
-            return []
+        # Query OpenLAM database (cached per normalized filter tuple)
+        cache_key = (
+            formula or "",
+            min_energy,
+            max_energy,
+            min_submission_time.isoformat() if min_submission_time else None,
+            max_submission_time.isoformat() if max_submission_time else None,
+            0,
+            n_results,
+        )
+        structures = _query_cache.get(cache_key)
+        if structures is None:
+            try:
+                data = CrystalStructure.query_by_offset(
+                    formula=formula,
+                    min_energy=min_energy,
+                    max_energy=max_energy,
+                    min_submission_time=min_submission_time,
+                    max_submission_time=max_submission_time,
+                    offset=0,
+                    limit=n_results,
+                )
+                structures = data.get("items") or []
+            except Exception as exc:
+                logging.error(f"OpenLAM query failed: {exc}")
+                return []
+            _query_cache.set(cache_key, tuple(structures))
+        # Fresh list per call; CrystalStructure items are only read downstream
+        structures = list(structures)
 
         if not structures:
+            # No folder / hash / files for empty results (misses are cached too)
+            logging.debug(f"OpenLAM: no structures matched filters {cache_key}")
             return []
 
-        # Save structures
-        filter_str = f"{formula or ''}|energy={min_energy}-{max_energy}|time={min_submission_time_str}-{max_submission_time_str}|n_results={n_results}"
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        short_hash = hashlib.sha1(filter_str.encode("utf-8")).hexdigest()[:8]
-        output_dir = self.data_dir / "mrdice_server" / "database" / "openlam_database" / "materials_data_openlam" / f"emin{min_energy or 0.0:.2f}_{ts}_{short_hash}"
-        output_dir.mkdir(parents=True, exist_ok=True)
-
+        # Save structures. The folder is content-addressed: filters, the returned
+        # structure ids and the formats all go into the hash, so a folder only
+        # ever holds one run's files and can be reused for the same results.
         output_formats = [output_format] if output_format else ["cif"]
-        try:
-            cleaned_structures = save_structures_openlam(
-                items=structures,
-                output_dir=output_dir,
-                output_formats=output_formats,
-            )
-        except Exception as exc:
-            logging.error(f"OpenLAM save failed: {exc}")
-            cleaned_structures = []
+        folder_key = "\x00".join(
+            map(str, (*cache_key, *(cs.id for cs in structures), *output_formats))
+        )
+        output_root = self.data_dir / "mrdice_server" / "database" / "openlam_database" / "materials_data_openlam"
+        output_dir = output_root / f"emin{min_energy or 0.0:.2f}_{short_hash(folder_key)}"
+
+        if output_dir.is_dir():
+            logging.info(f"OpenLAM: reusing saved structures in {output_dir}")
+        else:
+            _save_atomically(save_structures_openlam, structures, output_dir, output_formats)
 
         # Convert to SearchResult
         results: List[SearchResult] = []
         for i, cs in enumerate(structures):
             name = f"openlam_{cs.id}_{i}"
             
-            # Determine structure file path
-            structure_file = self.build_structure_file_path(output_dir, name, output_format, check_exists=True)
+            # Determine structure file path (named by the save path's own helper)
+            structure_file = self.build_structure_file_path(
+                output_dir, structure_basename(cs, i), output_format, check_exists=True
+            )
 
             results.append(
                 self.create_crystal_search_result(
@@ -24,8 +24,11 @@ def _import_optimade_utils():
             fetch_structures_with_bandgap_core,
             fetch_structures_with_filter_core,
             fetch_structures_with_spg_core,
+            _provider_name_from_url,
             normalize_cfr_in_filter,
             normalize_formula,
+            result_attribute,
+            run_on_background_loop,
         )
         return {
             "fetch_structures_with_filter_core": fetch_structures_with_filter_core,
@@ -33,6 +36,9 @@ def _import_optimade_utils():
             "fetch_structures_with_bandgap_core": fetch_structures_with_bandgap_core,
             "normalize_cfr_in_filter": normalize_cfr_in_filter,
             "normalize_formula": normalize_formula,
+            "provider_name_from_url": _provider_name_from_url,
+            "result_attribute": result_attribute,
+            "run_on_background_loop": run_on_background_loop,
         }
     except ImportError as e:
         logging.error(f"Failed to import OPTIMADE utils: {e}")
@@ -57,6 +63,9 @@ class OptimadeRetriever(BaseRetriever):
         fetch_structures_with_bandgap_core = utils["fetch_structures_with_bandgap_core"]
         normalize_cfr_in_filter = utils["normalize_cfr_in_filter"]
         normalize_formula = utils["normalize_formula"]
+        run_on_background_loop = utils["run_on_background_loop"]
+        provider_name_from_url = utils["provider_name_from_url"]
+        result_attribute = utils["result_attribute"]
 
         # Extract filters
         formula = filters.get("formula")
@@ -83,47 +92,43 @@ class OptimadeRetriever(BaseRetriever):
         as_format = [output_format] if output_format else ["cif"]
         http_timeout, total_timeout = get_optimade_timeouts()
 
-        async def run_with_timeout(coro):
-            return await asyncio.wait_for(coro, timeout=total_timeout)
+        # Run on the utils' persistent I/O loop (not asyncio.run) so the pooled
+        # HTTP client and its keep-alive connections are reused across searches.
+        def run_with_timeout(coro):
+            return run_on_background_loop(coro, timeout=total_timeout)
 
         try:
             if space_group:
-                fetch_result = asyncio.run(
-                    run_with_timeout(
-                        fetch_structures_with_spg_core(
-                            base_filter=base_filter,
-                            spg_number=int(space_group),
-                            base_output_dir=base_output_dir,
-                            as_format=as_format,
-                            n_results=n_results,
-                            http_timeout=http_timeout,
-                        )
+                fetch_result = run_with_timeout(
+                    fetch_structures_with_spg_core(
+                        base_filter=base_filter,
+                        spg_number=int(space_group),
+                        base_output_dir=base_output_dir,
+                        as_format=as_format,
+                        n_results=n_results,
+                        http_timeout=http_timeout,
                     )
                 )
             elif band_gap.get("min") is not None or band_gap.get("max") is not None:
-                fetch_result = asyncio.run(
-                    run_with_timeout(
-                        fetch_structures_with_bandgap_core(
-                            base_filter=base_filter,
-                            min_bg=band_gap.get("min"),
-                            max_bg=band_gap.get("max"),
-                            base_output_dir=base_output_dir,
-                            as_format=as_format,
-                            n_results=n_results,
-                            http_timeout=http_timeout,
-                        )
+                fetch_result = run_with_timeout(
+                    fetch_structures_with_bandgap_core(
+                        base_filter=base_filter,
+                        min_bg=band_gap.get("min"),
+                        max_bg=band_gap.get("max"),
+                        base_output_dir=base_output_dir,
+                        as_format=as_format,
+                        n_results=n_results,
+                        http_timeout=http_timeout,
                     )
                 )
             else:
-                fetch_result = asyncio.run(
-                    run_with_timeout(
-                        fetch_structures_with_filter_core(
-                            filter=base_filter,
-                            base_output_dir=base_output_dir,
-                            as_format=as_format,
-                            n_results=n_results,
-                            http_timeout=http_timeout,
-                        )
+                fetch_result = run_with_timeout(
+                    fetch_structures_with_filter_core(
+                        filter=base_filter,
+                        base_output_dir=base_output_dir,
+                        as_format=as_format,
+                        n_results=n_results,
+                        http_timeout=http_timeout,
                     )
                 )
         except asyncio.TimeoutError:
@@ -136,6 +141,12 @@ class OptimadeRetriever(BaseRetriever):
         cleaned_structures = fetch_result.get("cleaned_structures", []) or []
         saved_files = fetch_result.get("files", []) or []
 
+        # Saved filenames are like: <provider_name>_<id>_<idx>.<ext>; index them by
+        # "<provider_name>_<id>" once instead of scanning every file per structure.
+        files_by_key: Dict[str, str] = {}
+        for file_path in saved_files:
+            files_by_key.setdefault(Path(file_path).stem.rsplit("_", 1)[0], file_path)
+
         # Convert to SearchResult
         results: List[SearchResult] = []
         for i, struct_data in enumerate(cleaned_structures):
@@ -143,20 +154,21 @@ class OptimadeRetriever(BaseRetriever):
             struct_id = struct_data.get("id", f"idx{i}")
             
             # Find corresponding file
-            structure_file = None
-            # Saved filenames are like: <provider_name>_<id>_<idx>.<ext>
-            # `provider_url` is a full URL and won't appear in filenames, so match by id only.
-            for file_path in saved_files:
-                if str(struct_id) in str(file_path):
-                    structure_file = file_path
-                    break
-
-            formula = attrs.get("chemical_formula_reduced") or attrs.get("chemical_formula")
-            elements_list = attrs.get("elements", [])
-            space_group_val = attrs.get("space_group_symbol") or attrs.get("spacegroup_symbol")
-            n_atoms = attrs.get("nsites")
-            band_gap_val = attrs.get("band_gap") or attrs.get("_oqmd_band_gap") or attrs.get("_gnome_bandgap")
-            formation_energy = attrs.get("formation_energy_per_atom") or attrs.get("_oqmd_formation_energy_per_atom")
+            provider_url = struct_data.get("provider_url")
+            structure_file = (
+                files_by_key.get(f"{provider_name_from_url(provider_url)}_{struct_id}")
+                if provider_url
+                else None
+            )
+
+            # Attribute names come from the utils' RESULT_ATTRIBUTES, which also
+            # drives `response_fields`: keep lookups there, not inline here.
+            formula = result_attribute(attrs, "formula")
+            elements_list = result_attribute(attrs, "elements", [])
+            space_group_val = result_attribute(attrs, "space_group")
+            n_atoms = result_attribute(attrs, "n_atoms")
+            band_gap_val = result_attribute(attrs, "band_gap")
+            formation_energy = result_attribute(attrs, "formation_energy")
 
             results.append(
                 self.create_crystal_search_result(
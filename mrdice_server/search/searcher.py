@@ -3,6 +3,8 @@ Search execution module: parallel database searching.
 """
 import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
 from ..retrievers.base import Retriever
@@ -10,6 +12,7 @@ from ..retrievers.bohriumpublic import BohriumPublicRetriever
 from ..retrievers.mofdbsql import MofdbSqlRetriever
 from ..retrievers.openlam import OpenlamRetriever
 from ..retrievers.optimade import OptimadeRetriever
+from ..core.config import get_thread_pool_size
 from ..models.schema import SearchResult
 
 # All databases to be searched in parallel (no pre-selection)
@@ -21,6 +24,24 @@ ALL_DATABASE_NAMES: List[str] = [
 ]
 
 
+# Dedicated pool for blocking retriever fetches, sized by THREAD_POOL_SIZE instead of
+# the loop's default executor (min(32, cpu_count + 4) workers).
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create (once) and return the retriever thread pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_thread_pool_size(), thread_name_prefix="mrdice-search"
+                )
+    return _executor
+
+
 def _get_retriever(db_name: str) -> Optional[Retriever]:
     """
     Get retriever instance for database name.
@@ -58,9 +79,9 @@ async def _search_single_db(
             return db_name, [], None
         
         # Run synchronous fetch in executor
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         results = await loop.run_in_executor(
-            None,
+            _get_executor(),
             retriever.fetch,
             filters,
             n_results,
@@ -7,10 +7,6 @@ from .core.server import mcp, fetch_structures_from_db
 __all__ = ["mcp", "fetch_structures_from_db"]
 
 if __name__ == "__main__":
-    from .core.server import mcp, print_startup_env
-    import logging
-
-    print_startup_env()
-    logging.info("Starting MrDice Unified MCP Server...")
-    mcp.run(transport="sse")
+    from .core.server import main
 
+    main()
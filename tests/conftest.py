@@ -0,0 +1,13 @@
+"""
+Shared pytest setup.
+
+The database utils are plain top-level modules (no package `__init__`); the
+retrievers put `mrdice_server/database` on sys.path before importing them,
+so the tests do the same.
+"""
+import sys
+from pathlib import Path
+
+DATABASE_DIR = Path(__file__).resolve().parent.parent / "mrdice_server" / "database"
+if str(DATABASE_DIR) not in sys.path:
+    sys.path.insert(0, str(DATABASE_DIR))
@@ -0,0 +1,89 @@
+"""
+Tests for the MOFdb SQLite migrations (mofdbsql_database/migrate.py).
+"""
+import sqlite3
+
+import pytest
+
+from mofdbsql_database import migrate
+
+SCHEMA = """
+CREATE TABLE mofs (id INTEGER PRIMARY KEY, name TEXT, surface_area_m2g REAL);
+CREATE TABLE elements (id INTEGER PRIMARY KEY, mof_id INTEGER, element_symbol TEXT, n_atom INTEGER);
+CREATE TABLE isotherms (id INTEGER PRIMARY KEY, mof_id INTEGER, temperature REAL);
+CREATE TABLE isotherm_data (id INTEGER PRIMARY KEY, isotherm_id INTEGER);
+CREATE TABLE adsorbates (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE isotherm_species_data (
+    id INTEGER PRIMARY KEY, isotherm_data_id INTEGER, adsorbate_id INTEGER, adsorption REAL
+);
+CREATE TABLE heats (id INTEGER PRIMARY KEY, mof_id INTEGER);
+CREATE TABLE heat_data (id INTEGER PRIMARY KEY, heat_id INTEGER, total_adsorption REAL);
+"""
+
+
+def _make_db(path, schema=SCHEMA):
+    conn = sqlite3.connect(str(path))
+    conn.executescript(schema)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _tables(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+    finally:
+        conn.close()
+
+
+def _version(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return migrate.get_schema_version(conn)
+    finally:
+        conn.close()
+
+
+def test_full_migration_records_latest_version(tmp_path):
+    db = _make_db(tmp_path / "mofdb.sqlite")
+    assert migrate.migrate_mofdb(db) == migrate.SCHEMA_VERSION
+    assert _version(db) == migrate.SCHEMA_VERSION
+    assert {"idx_elements_mof_id", "mof_adsorbate_avg", "mof_temp_avg", "mof_heat_avg"} <= _tables(db)
+    # Idempotent
+    assert migrate.migrate_mofdb(db) == migrate.SCHEMA_VERSION
+
+
+def test_failed_statement_rolls_back_version_and_is_retried(tmp_path):
+    # No heat tables: v1's heat indexes fail
+    schema = SCHEMA.replace(
+        "CREATE TABLE heats (id INTEGER PRIMARY KEY, mof_id INTEGER);", ""
+    )
+    db = _make_db(tmp_path / "mofdb.sqlite", schema)
+
+    with pytest.raises(sqlite3.Error):
+        migrate.migrate_mofdb(db)
+    assert _version(db) == 0
+    # Nothing from the failed version survives, not even statements that ran before the failure
+    assert "idx_elements_mof_id" not in _tables(db)
+
+    # Once the table exists, the next run applies every version
+    conn = sqlite3.connect(str(db))
+    conn.execute("CREATE TABLE heats (id INTEGER PRIMARY KEY, mof_id INTEGER)")
+    conn.commit()
+    conn.close()
+    assert migrate.migrate_mofdb(db) == migrate.SCHEMA_VERSION
+    assert {"idx_heats_mof_id", "mof_heat_avg"} <= _tables(db)
+
+
+def test_failure_in_later_version_keeps_earlier_versions(tmp_path, monkeypatch):
+    db = _make_db(tmp_path / "mofdb.sqlite")
+    broken = [(1, migrate.SCHEMA_V1_INDEXES), (2, ["CREATE TABLE ok_table AS SELECT 1 AS x", "SELECT * FROM missing"])]
+    monkeypatch.setattr(migrate, "MIGRATIONS", broken)
+    monkeypatch.setattr(migrate, "SCHEMA_VERSION", 2)
+
+    with pytest.raises(sqlite3.Error):
+        migrate.migrate_mofdb(db)
+    assert _version(db) == 1
+    assert "idx_elements_mof_id" in _tables(db)
+    assert "ok_table" not in _tables(db)
@@ -0,0 +1,128 @@
+"""
+Unit tests for the MOFdb SQL guard in mofdbsql_database/utils.py.
+"""
+import os
+import tempfile
+
+import pytest
+
+# The utils resolve their data directory at import time
+os.environ.setdefault("MR_DICE_DATA_DIR", tempfile.gettempdir())
+
+from mofdbsql_database import utils  # noqa: E402
+
+
+# ---------------------------------------------------------------------------
+# validate_sql_security
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM mofs",
+        "  select name from mofs where void_fraction > 0.5;",
+        "WITH t AS (SELECT id FROM mofs) SELECT * FROM t",
+        # keywords only inside comments or literals
+        "SELECT * FROM mofs -- DROP TABLE mofs",
+        "SELECT * FROM mofs /* DELETE FROM mofs; */ WHERE id = 1",
+        "SELECT 'INSERT INTO x' AS s FROM mofs",
+        "SELECT \"update\" FROM mofs",
+        "SELECT `delete` FROM mofs",
+        "SELECT [drop] FROM mofs",
+        "SELECT * FROM mofs WHERE name = 'a; DROP TABLE mofs'",
+        # escaped and nested quotes stay inside one literal
+        "SELECT * FROM mofs WHERE name = 'it''s; DROP TABLE mofs'",
+        "SELECT * FROM mofs WHERE name = \"say \"\"DELETE\"\"\"",
+        "SELECT * FROM mofs WHERE name = \"it's\" AND db = 'a \"CREATE\" b'",
+        # identifiers that merely contain a keyword
+        "SELECT created_at, updated_by, replacement FROM mofs",
+        # the scalar REPLACE() function
+        "SELECT REPLACE(name, '-', '_') FROM mofs",
+        "SELECT replace (name, 'a', 'b') FROM mofs",
+    ],
+)
+def test_allows_read_only_queries(sql):
+    utils.validate_sql_security(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "DELETE FROM mofs",
+        "PRAGMA table_info(mofs)",
+        "-- comment\nDROP TABLE mofs",
+        # statement stacking
+        "SELECT * FROM mofs; DROP TABLE mofs",
+        "SELECT * FROM mofs; SELECT * FROM elements",
+        "SELECT * FROM mofs -- x\n; DELETE FROM mofs",
+        "SELECT * FROM mofs /* x */; UPDATE mofs SET name = 'x'",
+        # keywords in code next to literals/comments
+        "SELECT 'x' FROM mofs WHERE id IN (SELECT id FROM mofs) UNION SELECT 1 FROM (DELETE FROM mofs)",
+        "WITH d AS (DELETE FROM mofs RETURNING *) SELECT * FROM d",
+        "SELECT * FROM mofs WHERE 'a' = 'a' /* */ AND EXEC('x')",
+        # REPLACE as a statement rather than a function call
+        "WITH t AS (SELECT 1) REPLACE INTO mofs VALUES (1)",
+        "SELECT 1; REPLACE INTO mofs VALUES (1)",
+        # escaped quote closes and reopens: the DROP is code
+        "SELECT * FROM mofs WHERE name = 'it''s' ; DROP TABLE mofs",
+        # unterminated literal/comment are not stripped, so their content is checked
+        "SELECT * FROM mofs WHERE name = 'abc; DROP TABLE mofs",
+        "SELECT * FROM mofs /* DROP TABLE mofs",
+    ],
+)
+def test_rejects_writes_and_stacked_statements(sql):
+    with pytest.raises(ValueError):
+        utils.validate_sql_security(sql)
+
+
+def test_rejection_names_the_keyword():
+    with pytest.raises(ValueError, match="DROP"):
+        utils.validate_sql_security("WITH t AS (SELECT 1) SELECT * FROM t WHERE drop = 1")
+
+
+def test_strip_sql_literals_blanks_comments_and_literals():
+    code = utils.strip_sql_literals("SELECT 'a''b', \"c\" -- DROP\nFROM /* x */ mofs")
+    assert "DROP" not in code
+    assert code.split() == ["SELECT", ",", "FROM", "mofs"]
+
+
+# ---------------------------------------------------------------------------
+# prepare_sql
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT * FROM mofs", "SELECT * FROM mofs LIMIT 5"),
+        ("SELECT * FROM mofs;", "SELECT * FROM mofs LIMIT 5"),
+        ("SELECT * FROM mofs LIMIT 3", "SELECT * FROM mofs LIMIT 3"),
+        ("select * from mofs limit 3 offset 2;", "select * from mofs limit 3 offset 2"),
+        # LIMIT only in a literal, comment, subquery or CTE: the outer query is unbounded
+        ("SELECT * FROM mofs WHERE name = 'LIMIT 1'", "SELECT * FROM mofs WHERE name = 'LIMIT 1' LIMIT 5"),
+        ("SELECT * FROM mofs /* LIMIT 1 */", "SELECT * FROM mofs /* LIMIT 1 */ LIMIT 5"),
+        (
+            "SELECT * FROM mofs WHERE id IN (SELECT mof_id FROM elements LIMIT 10)",
+            "SELECT * FROM mofs WHERE id IN (SELECT mof_id FROM elements LIMIT 10) LIMIT 5",
+        ),
+        (
+            "WITH t AS (SELECT * FROM mofs LIMIT 100) SELECT * FROM t",
+            "WITH t AS (SELECT * FROM mofs LIMIT 100) SELECT * FROM t LIMIT 5",
+        ),
+        (
+            "SELECT * FROM (SELECT * FROM mofs LIMIT 50) t LIMIT 2",
+            "SELECT * FROM (SELECT * FROM mofs LIMIT 50) t LIMIT 2",
+        ),
+        # parentheses inside literals do not affect nesting
+        ("SELECT * FROM mofs WHERE name = ')' LIMIT 2", "SELECT * FROM mofs WHERE name = ')' LIMIT 2"),
+        ("SELECT * FROM mofs WHERE name = '(' LIMIT 2", "SELECT * FROM mofs WHERE name = '(' LIMIT 2"),
+        # a trailing line comment must not swallow the appended clause
+        ("SELECT * FROM mofs -- all", "SELECT * FROM mofs -- all\nLIMIT 5"),
+    ],
+)
+def test_prepare_sql_adds_outer_limit_only_when_missing(sql, expected):
+    assert utils.prepare_sql(sql, 5) == expected
+
+
+def test_prepare_sql_validates():
+    with pytest.raises(ValueError):
+        utils.prepare_sql("SELECT * FROM mofs; DROP TABLE mofs", 5)
@@ -0,0 +1,140 @@
+"""
+Unit tests for openlam_database/utils.py: the opt-in P1 CIF writer.
+"""
+import pytest
+
+from openlam_database import utils
+
+
+def _site(element, abc, occu=1, **extra):
+    return {"species": [{"element": element, "occu": occu}], "abc": list(abc), "properties": {}, **extra}
+
+
+def _structure_dict(sites):
+    return {
+        "lattice": {
+            "a": 4.0, "b": 4.0, "c": 4.0, "alpha": 90.0, "beta": 90.0, "gamma": 90.0, "volume": 64.0,
+        },
+        "sites": sites,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Fallback to CifWriter (no pymatgen needed)
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "sites",
+    [
+        pytest.param([_site("Fe", (0, 0, 0), occu=0.5)], id="partial-occupancy"),
+        pytest.param(
+            [{"species": [{"element": "Fe", "occu": 0.5}, {"element": "Co", "occu": 0.5}],
+              "abc": [0, 0, 0], "properties": {}}],
+            id="mixed-site",
+        ),
+        pytest.param(
+            [{"species": [{"element": "Fe", "occu": 1, "oxidation_state": 2}], "abc": [0, 0, 0],
+              "properties": {}}],
+            id="oxidation-state",
+        ),
+        pytest.param([_site("Fe", (0, 0, 0), properties={"magmom": 2.0})], id="site-properties"),
+        pytest.param([{"species": [{"occu": 1}], "abc": [0, 0, 0], "properties": {}}], id="no-element"),
+        pytest.param([], id="no-sites"),
+    ],
+)
+def test_fast_cif_falls_back_for_unsupported_sites(sites):
+    assert utils._fast_cif(_structure_dict(sites)) is None
+
+
+def test_fast_cif_falls_back_without_full_lattice():
+    d = _structure_dict([_site("Fe", (0, 0, 0))])
+    del d["lattice"]["volume"]
+    assert utils._fast_cif(d) is None
+
+
+def test_fast_cif_is_opt_in(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "_fast_cif", lambda d: calls.append(d) or "fast")
+    # With fast_cif off nothing may reach the P1 writer, even for simple sites
+    monkeypatch.setattr(utils, "CIF_PROCESS_POOL_MIN_ITEMS", 10**9)
+
+    class _Writer:
+        def __init__(self, structure):
+            self.structure = structure
+
+        def __str__(self):
+            return f"cifwriter:{self.structure}"
+
+    monkeypatch.setattr(utils, "_pymatgen_cif", lambda: (None, _Writer))
+
+    class _Item:
+        structure = "s0"
+
+    full = [{"structure": _structure_dict([_site("Fe", (0, 0, 0))])}]
+    assert utils._render_cifs([_Item()], full) == ["cifwriter:s0"]
+    assert calls == []
+    assert utils._render_cifs([_Item()], full, fast_cif=True) == ["fast"]
+
+
+# ---------------------------------------------------------------------------
+# Round trip against pymatgen's CifWriter
+# ---------------------------------------------------------------------------
+
+def _parse(cif_text):
+    from pymatgen.core import Structure
+
+    return Structure.from_str(cif_text, fmt="cif")
+
+
+def _assert_same_structure(a, b):
+    assert a.lattice.abc == pytest.approx(b.lattice.abc, abs=1e-6)
+    assert a.lattice.angles == pytest.approx(b.lattice.angles, abs=1e-6)
+    assert len(a) == len(b)
+    # Site order is preserved by both writers
+    for sa, sb in zip(a, b):
+        assert sa.species == sb.species
+        assert sa.frac_coords == pytest.approx(sb.frac_coords, abs=1e-6)
+
+
+@pytest.mark.parametrize(
+    "species, coords, lattice",
+    [
+        (["Fe", "O", "O", "Fe"], [[0, 0, 0], [0.5, 0.5, 0], [0.5, 0, 0.5], [0.25, 0.75, 0.5]],
+         ((4.1, 0, 0), (0, 5.2, 0), (0, 0, 6.3))),
+        (["Li", "Co", "O", "O"], [[0, 0, 0], [0, 0, 0.5], [0, 0, 0.24], [0, 0, 0.76]],
+         ((2.8, 0, 0), (-1.4, 2.42487, 0), (0, 0, 14.1))),
+        (["Si", "Si"], [[0, 0, 0], [0.25, 0.25, 0.25]],
+         ((0, 2.7, 2.7), (2.7, 0, 2.7), (2.7, 2.7, 0))),
+    ],
+)
+def test_fast_cif_round_trips_like_cifwriter(species, coords, lattice):
+    pytest.importorskip("pymatgen")
+    from pymatgen.core import Lattice, Structure
+    from pymatgen.io.cif import CifWriter
+
+    structure = Structure(Lattice(lattice), species, coords)
+    fast = utils._fast_cif(structure.as_dict())
+    assert fast is not None
+
+    parsed = _parse(fast)
+    _assert_same_structure(parsed, _parse(str(CifWriter(structure))))
+    _assert_same_structure(parsed, structure)
+
+
+def test_partial_occupancy_renders_through_cifwriter():
+    pytest.importorskip("pymatgen")
+    from pymatgen.core import Lattice, Structure
+
+    structure = Structure(Lattice.cubic(4.0), [{"Fe": 0.5, "Co": 0.5}, "O"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+
+    class _Item:
+        pass
+
+    item = _Item()
+    item.structure = structure
+    full = [{"structure": structure.as_dict()}]
+    (text,) = utils._render_cifs([item], full, fast_cif=True)
+
+    parsed = _parse(text)
+    assert parsed[0].species.as_dict() == pytest.approx({"Fe": 0.5, "Co": 0.5})
+    _assert_same_structure(parsed, structure)
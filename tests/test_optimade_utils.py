@@ -0,0 +1,612 @@
+"""
+Unit tests for the pure helpers in optimade_database/utils.py.
+"""
+import ast
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pymatgen")
+pytest.importorskip("oss2")
+
+from optimade_database import utils  # noqa: E402
+
+RETRIEVER_PATH = Path(utils.__file__).resolve().parents[2] / "retrievers" / "optimade.py"
+
+
+# ---------------------------------------------------------------------------
+# response_fields vs. attributes read by the retriever
+# ---------------------------------------------------------------------------
+
+def _retriever_attribute_reads():
+    """(fields passed to result_attribute, literal keys read with attrs.get) in the retriever."""
+    tree = ast.parse(RETRIEVER_PATH.read_text(encoding="utf-8"))
+    fields, literal_keys = set(), set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        args = node.args
+        if isinstance(func, ast.Name) and func.id == "result_attribute" and len(args) >= 2:
+            if isinstance(args[1], ast.Constant):
+                fields.add(args[1].value)
+        elif (
+            isinstance(func, ast.Attribute) and func.attr == "get"
+            and isinstance(func.value, ast.Name) and func.value.id == "attrs"
+            and args and isinstance(args[0], ast.Constant)
+        ):
+            literal_keys.add(args[0].value)
+    return fields, literal_keys
+
+
+def test_retriever_reads_only_declared_result_attributes():
+    fields, literal_keys = _retriever_attribute_reads()
+    assert fields, "retriever no longer uses result_attribute()"
+    assert fields <= set(utils.RESULT_ATTRIBUTES)
+    # Direct attrs.get("...") reads bypass RESULT_ATTRIBUTES and would be missing
+    # from response_fields: declare them in RESULT_ATTRIBUTES instead.
+    assert literal_keys <= set(utils.RESPONSE_FIELDS), literal_keys - set(utils.RESPONSE_FIELDS)
+
+
+def test_response_fields_cover_result_and_cif_attributes():
+    declared = {name for names in utils.RESULT_ATTRIBUTES.values() for name in names}
+    assert declared <= set(utils.RESPONSE_FIELDS)
+    assert set(utils.CIF_ATTRIBUTES) <= set(utils.RESPONSE_FIELDS)
+    assert len(utils.RESPONSE_FIELDS) == len(set(utils.RESPONSE_FIELDS))
+
+
+def test_response_fields_add_prefixed_fields_from_clause():
+    fields = utils._response_fields('_alexandria_band_gap>=1 AND elements HAS "Fe"').split(",")
+    assert "_alexandria_band_gap" in fields
+    assert fields[: len(utils.RESPONSE_FIELDS)] == list(utils.RESPONSE_FIELDS)
+
+
+@pytest.mark.parametrize(
+    "attrs, field, expected",
+    [
+        ({"chemical_formula_reduced": "Fe2O3", "chemical_formula": "x"}, "formula", "Fe2O3"),
+        ({"chemical_formula": "Fe2O3"}, "formula", "Fe2O3"),
+        ({"space_group_symbol": None, "spacegroup_symbol": "Fm-3m"}, "space_group", "Fm-3m"),
+        ({"_gnome_bandgap": 1.5}, "band_gap", 1.5),
+        ({"band_gap": 0.0, "_oqmd_band_gap": 2.0}, "band_gap", 0.0),
+        ({}, "formation_energy", None),
+    ],
+)
+def test_result_attribute_lookup_order(attrs, field, expected):
+    assert utils.result_attribute(attrs, field) == expected
+
+
+@pytest.mark.skipif("OPTIMADE_RESPONSE_FIELDS" in os.environ, reason="explicitly configured")
+def test_response_fields_restriction_is_off_by_default():
+    assert utils.RESTRICT_RESPONSE_FIELDS is False
+
+
+# ---------------------------------------------------------------------------
+# quota distribution
+# ---------------------------------------------------------------------------
+
+def _round_robin_fill_per_unit(assigned, caps, left):
+    """Reference: hand out one unit at a time, cycling over URLs with headroom."""
+    while left > 0:
+        placed = False
+        for i, cap in enumerate(caps):
+            if left and assigned[i] < cap:
+                assigned[i] += 1
+                left -= 1
+                placed = True
+        if not placed:
+            break
+    return left
+
+
+def _distribute_quota_per_unit(stats, n_results):
+    """Reference for distribute_quota_fair that raises clause totals one unit at a time."""
+    if not stats or n_results <= 0:
+        return {}
+    plan = {c: dict.fromkeys(urls, 0) for c, urls in stats.items()}
+    active = [c for c, urls in stats.items() if sum(urls.values()) > 0]
+    if not active:
+        return plan
+
+    totals = {}
+    for idx, c in enumerate(active):
+        caps = list(stats[c].values())
+        want = n_results // len(active) + (1 if idx < n_results % len(active) else 0)
+        target = min(sum(caps), want)
+        assigned = [
+            min(target // len(caps) + (1 if ui < target % len(caps) else 0), cap)
+            for ui, cap in enumerate(caps)
+        ]
+        _round_robin_fill_per_unit(assigned, caps, target - sum(assigned))
+        plan[c] = dict(zip(stats[c], assigned))
+        totals[c] = sum(assigned)
+
+    raised = dict(totals)
+    for _ in range(n_results - sum(totals.values())):
+        open_clauses = [c for c in active if raised[c] < sum(stats[c].values())]
+        if not open_clauses:
+            break
+        raised[min(open_clauses, key=lambda c: raised[c])] += 1
+    for c in active:
+        assigned = list(plan[c].values())
+        _round_robin_fill_per_unit(assigned, list(stats[c].values()), raised[c] - totals[c])
+        plan[c] = dict(zip(stats[c], assigned))
+    return plan
+
+
+@pytest.mark.parametrize(
+    "assigned, caps, left, expected, unplaced",
+    [
+        ([0, 0, 0], [2, 2, 2], 5, [2, 2, 1], 0),
+        ([0, 0, 0], [0, 1, 5], 4, [0, 1, 3], 0),
+        ([1, 0], [1, 3], 5, [1, 3], 2),
+        ([2], [2], 3, [2], 3),
+        ([0, 0], [4, 4], 0, [0, 0], 0),
+        ([0, 0, 0], [0, 0, 0], 2, [0, 0, 0], 2),
+    ],
+)
+def test_round_robin_fill(assigned, caps, left, expected, unplaced):
+    assert utils._round_robin_fill(assigned, caps, left) == unplaced
+    assert assigned == expected
+
+
+@pytest.mark.parametrize(
+    "stats, n_results, expected",
+    [
+        # nothing to distribute
+        ({}, 5, {}),
+        ({"a": {"u1": 3}}, 0, {}),
+        # zero candidates: every URL reported no results
+        ({"a": {"u1": 0}, "b": {}}, 5, {"a": {"u1": 0}, "b": {}}),
+        # quota larger than everything available: every URL is taken to its cap
+        (
+            {"a": {"u1": 2, "u2": 1}, "b": {"u3": 3}, "c": {"u4": 0}},
+            100,
+            {"a": {"u1": 2, "u2": 1}, "b": {"u3": 3}, "c": {"u4": 0}},
+        ),
+        # remainder goes to the earliest clauses / URLs
+        ({"a": {"u1": 5}, "b": {"u2": 5}}, 3, {"a": {"u1": 2}, "b": {"u2": 1}}),
+        ({"a": {"u1": 5, "u2": 5}}, 3, {"a": {"u1": 2, "u2": 1}}),
+        # uneven caps: small URLs / clauses saturate, the rest are water-filled evenly
+        (
+            {"a": {"u1": 1, "u2": 10}, "b": {"u3": 2}, "c": {"u4": 10}},
+            12,
+            {"a": {"u1": 1, "u2": 4}, "b": {"u3": 2}, "c": {"u4": 5}},
+        ),
+        (
+            {"a": {"u1": 1}, "b": {"u2": 100, "u3": 2}},
+            50,
+            {"a": {"u1": 1}, "b": {"u2": 47, "u3": 2}},
+        ),
+    ],
+)
+def test_distribute_quota_fair(stats, n_results, expected):
+    plan = utils.distribute_quota_fair(stats, n_results)
+    assert plan == expected
+    # insertion order of providers and URLs is preserved
+    assert [list(urls) for urls in plan.values()] == [list(urls) for urls in expected.values()]
+
+
+def test_distribute_quota_fair_matches_per_unit_reference():
+    import random
+
+    rng = random.Random(0)
+    for _ in range(300):
+        stats = {
+            f"p{c}": {f"p{c}u{u}": rng.choice([0, 1, 2, 3, 7, 20]) for u in range(rng.randint(0, 4))}
+            for c in range(rng.randint(1, 5))
+        }
+        n_results = rng.randint(0, 60)
+        plan = utils.distribute_quota_fair(stats, n_results)
+        assert plan == _distribute_quota_per_unit(stats, n_results), (stats, n_results)
+        total = sum(sum(urls.values()) for urls in stats.values())
+        assert sum(sum(urls.values()) for urls in plan.values()) == min(n_results, total)
+
+
+# ---------------------------------------------------------------------------
+# CIF pre-validation
+# ---------------------------------------------------------------------------
+
+_LATTICE = [[3.0, 0.0, 0.0], [0.0, 3.0, 0.0], [0.0, 0.0, 3.0]]
+
+
+@pytest.mark.parametrize(
+    "sd, reason",
+    [
+        (None, "missing attributes"),
+        ({"id": "x"}, "missing attributes"),
+        ({"attributes": {"species_at_sites": ["Fe"]}}, "lattice_vectors"),
+        ({"attributes": {"lattice_vectors": _LATTICE[:2]}}, "lattice_vectors"),
+        (
+            {"attributes": {"lattice_vectors": [[3.0, 0.0, 0.0], [0.0, 3.0, 0.0], [None, None, None]]}},
+            "lattice_vectors",
+        ),
+        ({"attributes": {"lattice_vectors": _LATTICE, "species_at_sites": []}}, "no sites"),
+        (
+            {
+                "attributes": {
+                    "lattice_vectors": _LATTICE,
+                    "species_at_sites": ["Fe", "O"],
+                    "cartesian_site_positions": [[0.0, 0.0, 0.0]],
+                }
+            },
+            "2 species for 1 positions",
+        ),
+    ],
+)
+def test_cif_job_rejects_malformed_structures(sd, reason):
+    job = utils._cif_job(sd)
+    assert isinstance(job, ValueError)
+    assert reason in str(job)
+
+
+def test_cif_job_returns_cif_bytes_arguments():
+    sd = {
+        "attributes": {
+            "lattice_vectors": _LATTICE,
+            "species_at_sites": ["Fe"],
+            "cartesian_site_positions": [[0.0, 0.0, 0.0]],
+        }
+    }
+    assert utils._cif_job(sd) == (_LATTICE, ["Fe"], [[0.0, 0.0, 0.0]])
+
+
+# ---------------------------------------------------------------------------
+# page parsing
+# ---------------------------------------------------------------------------
+
+class _FakeResponse:
+    def __init__(self, body: bytes, chunk_size: int = 7):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    async def aread(self) -> bytes:
+        self.bytes_read = len(self.body)
+        return self.body
+
+    async def aiter_bytes(self):
+        for i in range(0, len(self.body), self.chunk_size):
+            chunk = self.body[i:i + self.chunk_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+def _page(n: int, next_link=None) -> bytes:
+    body = {"data": [{"id": str(i), "attributes": {"nsites": i}} for i in range(n)]}
+    if next_link is not None:
+        body["links"] = {"next": next_link}
+    return json.dumps(body).encode("utf-8")
+
+
+@pytest.fixture(params=["buffered", "ijson"])
+def page_parser(request, monkeypatch):
+    if request.param == "buffered":
+        monkeypatch.setattr(utils, "ijson", None)
+    elif utils.ijson is None:
+        pytest.skip("ijson not installed")
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "next_link, expected",
+    [
+        (None, None),
+        ("https://example.org/v1/structures?page=2", "https://example.org/v1/structures?page=2"),
+        ({"href": "https://example.org/v1/structures?page=2"}, "https://example.org/v1/structures?page=2"),
+    ],
+)
+async def test_read_page_returns_entries_and_next_link(page_parser, next_link, expected):
+    data, next_url = await utils._read_page(_FakeResponse(_page(3, next_link)), remaining=10)
+    assert [d["id"] for d in data] == ["0", "1", "2"]
+    assert next_url == expected
+
+
+async def test_read_page_handles_missing_data(page_parser):
+    data, next_url = await utils._read_page(_FakeResponse(b'{"meta": {}}'), remaining=10)
+    assert data == []
+    assert next_url is None
+
+
+async def test_read_page_stops_streaming_once_enough_entries():
+    if utils.ijson is None:
+        pytest.skip("ijson not installed")
+    resp = _FakeResponse(_page(200, "https://example.org/next"))
+    data, next_url = await utils._read_page(resp, remaining=2)
+    assert len(data) >= 2
+    # the next link is dropped and the rest of the body is never read
+    assert next_url is None
+    assert resp.bytes_read < len(resp.body)
+
+
+# ---------------------------------------------------------------------------
+# request coalescing and the result cache
+# ---------------------------------------------------------------------------
+
+class _DictCache:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+@pytest.fixture
+def fake_get(monkeypatch):
+    """Replace the HTTP layer with a counting stub and use an empty in-memory cache."""
+    import asyncio
+
+    calls = []
+
+    async def _fake_optimade_get(client, base_url, filt, n_results, http_timeout=None, response_fields=None):
+        calls.append((base_url, filt, n_results))
+        await asyncio.sleep(0.01)
+        if "fail" in filt:
+            return {"data": [], "errors": ["boom"]}
+        return {"data": [{"id": f"{base_url}:{i}"} for i in range(n_results)]}
+
+    cache = _DictCache()
+    monkeypatch.setattr(utils, "_optimade_get", _fake_optimade_get)
+    monkeypatch.setattr(utils, "_get_payload_cache", lambda: cache)
+    monkeypatch.setattr(utils, "_CACHE_DIR", None)
+    monkeypatch.setattr(utils, "_inflight", {})
+    return calls
+
+
+async def test_coalesced_requests_share_one_call_on_background_loop(fake_get, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(utils, "_bg_loop", asyncio.get_running_loop())
+    results = await asyncio.gather(
+        *(utils._optimade_get_coalesced(None, "https://a", "f", 2) for _ in range(5))
+    )
+    assert len(fake_get) == 1
+    assert all(r == results[0] for r in results)
+    # every caller gets its own data list
+    assert len({id(r["data"]) for r in results}) == len(results)
+    assert utils._inflight == {}
+
+
+async def test_different_requests_are_not_coalesced(fake_get, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(utils, "_bg_loop", asyncio.get_running_loop())
+    await asyncio.gather(
+        utils._optimade_get_coalesced(None, "https://a", "f", 2),
+        utils._optimade_get_coalesced(None, "https://b", "f", 2),
+        utils._optimade_get_coalesced(None, "https://a", "f", 3),
+        utils._optimade_get_coalesced(None, "https://a", "f", 2, response_fields="id"),
+    )
+    assert len(fake_get) == 4
+
+
+async def test_no_coalescing_off_the_background_loop(fake_get, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(utils, "_bg_loop", None)
+    await asyncio.gather(*(utils._optimade_get_coalesced(None, "https://a", "f", 2) for _ in range(3)))
+    assert len(fake_get) == 3
+
+
+async def test_cache_hit_skips_the_request_unless_bypassed(fake_get):
+    first = await utils._optimade_get_coalesced(None, "https://a", "f", 2)
+    first["data"].clear()  # callers own their copy; the cached payload is unaffected
+    second = await utils._optimade_get_coalesced(None, "https://a", "f", 2)
+    assert len(fake_get) == 1
+    assert len(second["data"]) == 2
+
+    await utils._optimade_get_coalesced(None, "https://a", "f", 2, bypass_cache=True)
+    assert len(fake_get) == 2
+
+
+async def test_failed_responses_are_not_cached(fake_get, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(utils, "_bg_loop", asyncio.get_running_loop())
+    for _ in range(2):
+        result = await utils._optimade_get_coalesced(None, "https://a", "fail", 2)
+        assert result["errors"] == ["boom"]
+    assert len(fake_get) == 2
+
+
+# ---------------------------------------------------------------------------
+# request limits and retries
+# ---------------------------------------------------------------------------
+
+class _FakeStreamClient:
+    """`client.stream()` stand-in: `handler(url)` runs inside the request and may block or raise."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def stream(self, method, url, params=None, **extra):
+        from contextlib import asynccontextmanager
+
+        @asynccontextmanager
+        async def _cm():
+            await self.handler(url)
+            yield _OkResponse()
+
+        return _cm()
+
+
+class _OkResponse:
+    status_code = 200
+    headers: dict = {}
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def fake_read_page(monkeypatch):
+    async def _fake_read_page(resp, remaining):
+        return [{"id": "x"}], None
+
+    monkeypatch.setattr(utils, "_read_page", _fake_read_page)
+
+
+async def test_blocked_host_does_not_starve_other_hosts(fake_read_page, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(utils, "OPTIMADE_MAX_PER_HOST", 1)
+    monkeypatch.setattr(utils, "OPTIMADE_MAX_IN_FLIGHT", 2)
+    release = asyncio.Event()
+
+    async def handler(url):
+        if "slow" in url:
+            await release.wait()
+
+    client = _FakeStreamClient(handler)
+    slow = [
+        asyncio.ensure_future(utils._get_page(client, "https://slow.example/s", None, {}, 1))
+        for _ in range(4)
+    ]
+    await asyncio.sleep(0)
+    # Queued slow-host requests wait on their host's slot, not on overall slots
+    page = await asyncio.wait_for(utils._get_page(client, "https://fast.example/s", None, {}, 1), 1.0)
+    assert page == ([{"id": "x"}], None)
+
+    release.set()
+    assert len(await asyncio.gather(*slow)) == 4
+
+
+async def test_read_timeouts_are_retried(fake_read_page, monkeypatch):
+    import httpx
+
+    monkeypatch.setattr(utils, "_RETRY_MAX_DELAY", 0.0)
+    attempts = []
+
+    async def handler(url):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise httpx.ReadTimeout("slow body")
+
+    page = await utils._get_page(_FakeStreamClient(handler), "https://a.example/s", None, {}, 1)
+    assert page == ([{"id": "x"}], None)
+    assert len(attempts) == 2
+
+
+async def test_timeouts_are_raised_after_the_last_retry(fake_read_page, monkeypatch):
+    import httpx
+
+    monkeypatch.setattr(utils, "_RETRY_MAX_DELAY", 0.0)
+    monkeypatch.setattr(utils, "OPTIMADE_MAX_RETRIES", 1)
+    attempts = []
+
+    async def handler(url):
+        attempts.append(url)
+        raise httpx.ReadTimeout("slow body")
+
+    with pytest.raises(httpx.ReadTimeout):
+        await utils._get_page(_FakeStreamClient(handler), "https://a.example/s", None, {}, 1)
+    assert len(attempts) == 2
+
+
+# ---------------------------------------------------------------------------
+# saving
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def failing_writes(monkeypatch):
+    """Make Path.write_bytes raise for file names containing any of the returned set's entries."""
+    fail_on: set = set()
+    real_write_bytes = Path.write_bytes
+
+    def _write_bytes(self, data):
+        for marker in list(fail_on):
+            if marker in self.name:
+                fail_on.discard(marker)
+                raise OSError(f"disk full: {self.name}")
+        return real_write_bytes(self, data)
+
+    monkeypatch.setattr(Path, "write_bytes", _write_bytes)
+    return fail_on
+
+
+def _results(**urls):
+    return {"structures": {"c": {url: {"data": [{"id": i, "attributes": {}} for i in ids]} for url, ids in urls.items()}}}
+
+
+def test_save_structures_replaces_failed_writes(tmp_path, failing_writes):
+    failing_writes.add("_a_")  # the first write of structure "a" fails
+    results = _results(**{"https://u1.example": ["a", "b", "c"], "https://u2.example": ["a"]})
+    plan = {"c": {"https://u1.example": 2, "https://u2.example": 1}}
+
+    files, warnings, _, cleaned = utils.save_structures(results, tmp_path, False, plan)
+
+    # u1 fills its quota from the next candidate; "a" stays free for u2
+    assert [(s["provider_url"], s["id"]) for s in cleaned] == [
+        ("https://u1.example", "b"),
+        ("https://u1.example", "c"),
+        ("https://u2.example", "a"),
+    ]
+    assert len(files) == 3 and all(Path(f).is_file() for f in files)
+    assert any("Failed to write" in w for w in warnings)
+    assert not any("underfilled" in w for w in warnings)
+
+
+def test_save_structures_reports_underfill_when_write_fails(tmp_path, failing_writes):
+    failing_writes.add("_a_")
+    results = _results(**{"https://u1.example": ["a"]})
+
+    files, warnings, _, cleaned = utils.save_structures(results, tmp_path, False, {"c": {"https://u1.example": 1}})
+
+    assert files == [] and cleaned == []
+    assert any("underfilled quota" in w and "saved 0" in w for w in warnings)
+
+
+def _wait_for_files(folder: Path, pattern: str, timeout: float = 2.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = list(folder.glob(pattern))
+        if found:
+            return found
+        time.sleep(0.01)
+    return []
+
+
+async def test_disk_cache_round_trip_off_the_loop(fake_get, tmp_path, monkeypatch):
+    import threading
+
+    monkeypatch.setattr(utils, "_CACHE_DIR", str(tmp_path))
+    first = await utils._optimade_get_coalesced(None, "https://a", "f", 2)
+    assert len(_wait_for_files(tmp_path, "*.json")) == 1
+
+    # a fresh process: empty memory cache, the disk copy is read on a worker thread
+    monkeypatch.setattr(utils, "_get_payload_cache", lambda cache=_DictCache(): cache)
+    read_threads = []
+    real_read = utils._read_cache_file
+
+    def _read(path):
+        read_threads.append(threading.current_thread())
+        return real_read(path)
+
+    monkeypatch.setattr(utils, "_read_cache_file", _read)
+    second = await utils._optimade_get_coalesced(None, "https://a", "f", 2)
+
+    assert second == first
+    assert len(fake_get) == 1
+    assert read_threads and threading.main_thread() not in read_threads
+
+
+def test_disk_cache_writes_leave_no_temp_files(tmp_path):
+    path = tmp_path / "entry.json"
+    for i in range(3):
+        utils._write_cache_file(path, {"data": [{"id": str(i)}]})
+    assert [p.name for p in tmp_path.iterdir()] == ["entry.json"]
+    assert utils._read_cache_file(path) == {"data": [{"id": "2"}]}
+
+
+def test_disk_cache_ignores_expired_entries(tmp_path, monkeypatch):
+    path = tmp_path / "entry.json"
+    utils._write_cache_file(path, {"data": []})
+    monkeypatch.setattr(utils, "_CACHE_DISK_TTL", -1.0)
+    assert utils._read_cache_file(path) is None